@@ -4,9 +4,11 @@ Copyright (c) 2019 - present AppSeed.us
 """
 
 
-from flask import Flask
-
-app = Flask(__name__)
-
-# Import views to register routes
-from app import views
+def __getattr__(name):
+    # `from app import app` (run.py) builds the Flask site on first use, so the Django
+    # project, which only needs this package's templates, static files and commands,
+    # never imports Flask
+    if name == 'app':
+        from .flask_app import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
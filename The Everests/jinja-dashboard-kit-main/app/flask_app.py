@@ -0,0 +1,16 @@
+# -*- encoding: utf-8 -*-
+"""
+Copyright (c) 2019 - present AppSeed.us
+"""
+
+
+from flask import Flask, url_for
+
+# Named after the package so templates and static files resolve from app/ as before
+app = Flask('app')
+
+# The templates reference assets as {{ path|static }} (app/templatetags/assets.py)
+app.jinja_env.filters['static'] = lambda path: url_for('static', filename=path)
+
+# Import views to register routes
+from app import views
@@ -0,0 +1,18 @@
+"""
+The `static` filter: `{{ 'assets/js/pcoded.js'|static }}` gives the asset's
+hashed URL from the staticfiles manifest.
+
+The templates are also rendered by the legacy Flask app (run.py), which can't
+parse Django's `{% load %}`/`{% static %}` tags. A filter is valid in both
+engines: Django gets it as a builtin (settings.TEMPLATES), Flask registers its
+own `static` filter in app/flask_app.py.
+"""
+from django import template
+from django.templatetags.static import static as static_url
+
+register = template.Library()
+
+
+@register.filter
+def static(path):
+    return static_url(path)
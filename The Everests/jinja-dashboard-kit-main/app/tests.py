@@ -0,0 +1,25 @@
+from django.template.loader import render_to_string
+from django.templatetags.static import static
+from django.test import SimpleTestCase
+
+
+class SharedTemplateTests(SimpleTestCase):
+    """The templates are rendered by both Django and the legacy Flask app (run.py)."""
+
+    pages = ['xero', 'auth-signin', 'chart-apex', 'icon-feather', 'map-google']
+    asset = 'assets/js/pcoded.js'
+
+    def test_django_renders_static_urls(self):
+        for page in self.pages:
+            with self.subTest(page=page):
+                self.assertIn(f'src="{static(self.asset)}"', render_to_string(f'home/{page}.html'))
+
+    def test_flask_renders_the_same_templates(self):
+        from app.flask_app import app
+
+        client = app.test_client()
+        for page in self.pages:
+            with self.subTest(page=page):
+                response = client.get(f'/{page}' if page == 'xero' else f'/{page}.html')
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(f'src="/static/{self.asset}"', response.get_data(as_text=True))
@@ -2,6 +2,8 @@
 ASGI config for childcare_admin project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with uvicorn (see README) so the async Xero views share one HTTP
+client per worker, opened on first use and closed by the ASGI lifespan shutdown.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -11,6 +13,10 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from occupancy.lifespan import with_lifespan
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'childcare_admin.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+application = with_lifespan(django_application)
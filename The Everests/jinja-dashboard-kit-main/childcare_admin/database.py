@@ -0,0 +1,64 @@
+"""
+DATABASES['default'] from the environment.
+
+DATABASE_URL picks the database (the SQLite file next to manage.py by default).
+For Postgres, DB_POOL chooses how gunicorn workers and management commands
+(scraper, imports, Xero sync) hold their connections:
+
+    persistent  (default) each worker thread keeps its own connection for
+                DB_CONN_MAX_AGE seconds (default 600)
+    psycopg     Django's psycopg 3 pool, one per process: DB_POOL_MIN_SIZE to
+                DB_POOL_MAX_SIZE connections (default 2 to 10), requests wait up
+                to DB_POOL_TIMEOUT seconds (default 10) for a free one
+    pgbouncer   DATABASE_URL points at PgBouncer in transaction pooling mode:
+                server-side cursors and psycopg's prepared statements are off,
+                since neither survives a transaction moving between server
+                connections; persistent connections to PgBouncer as above
+
+Connections are checked before reuse in every mode (CONN_HEALTH_CHECKS, or the
+check Django gives the pool), so a connection dropped by Supabase/Heroku or PgBouncer
+costs a reconnect rather than a failed request. Set DB_SSL_REQUIRE=false for a
+local Postgres; it defaults to true whenever DATABASE_URL is set.
+"""
+import importlib.util
+
+import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
+
+POOL_MODES = ('persistent', 'psycopg', 'pgbouncer')
+
+
+def _flag(environ, name, default):
+    return environ.get(name, str(default)).lower() in ('true', '1', 'yes')
+
+
+def database_config(environ, default_url):
+    mode = environ.get('DB_POOL', 'persistent').lower()
+    if mode not in POOL_MODES:
+        raise ImproperlyConfigured(f"DB_POOL must be one of {', '.join(POOL_MODES)}, not {mode!r}")
+    config = dj_database_url.parse(environ.get('DATABASE_URL') or default_url)
+    postgres = config['ENGINE'] == 'django.db.backends.postgresql'
+    if mode != 'persistent' and not postgres:
+        raise ImproperlyConfigured(f'DB_POOL={mode} needs a Postgres DATABASE_URL')
+
+    options = config.setdefault('OPTIONS', {})
+    if postgres and _flag(environ, 'DB_SSL_REQUIRE', 'DATABASE_URL' in environ):
+        options['sslmode'] = 'require'
+
+    if mode == 'psycopg':
+        # Pooled connections are returned at the end of each request instead of being kept
+        config['CONN_MAX_AGE'] = 0
+        options['pool'] = {
+            'min_size': int(environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+        return config
+
+    config['CONN_MAX_AGE'] = int(environ.get('DB_CONN_MAX_AGE', 600))
+    config['CONN_HEALTH_CHECKS'] = _flag(environ, 'DB_CONN_HEALTH_CHECKS', True)
+    if mode == 'pgbouncer':
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+        if importlib.util.find_spec('psycopg'):
+            options['prepare_threshold'] = None
+    return config
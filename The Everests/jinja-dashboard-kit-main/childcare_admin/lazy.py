@@ -0,0 +1,40 @@
+"""
+Views imported on their first request instead of when the URLconf loads.
+
+Integrations (Xero, the AI agent) pull in their HTTP and API client libraries
+when imported; routing them through lazy_view keeps those imports out of every
+worker's startup and out of management commands, and a broken integration
+module only fails its own URLs.
+
+CsrfViewMiddleware and Django's sync/async handling look at the route's view
+before it is loaded, so both are declared up front: `is_async` for an async
+function or a View with async handlers, `csrf_exempt` to match a csrf_exempt
+view (DRF's APIView.as_view() is one).
+"""
+import functools
+
+from asgiref.sync import iscoroutinefunction
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+def lazy_view(dotted_path, *, is_async=False, csrf_exempt=False):
+    """A view for `path()` that imports `dotted_path` (a view function or View class) when first called."""
+    @functools.cache
+    def load():
+        target = import_string(dotted_path)
+        view = target.as_view() if isinstance(target, type) else target
+        if iscoroutinefunction(view) != is_async:
+            raise ImproperlyConfigured(f"lazy_view({dotted_path!r}) needs is_async={not is_async}")
+        return view
+
+    if is_async:
+        async def view(request, *args, **kwargs):
+            return await load()(request, *args, **kwargs)
+    else:
+        def view(request, *args, **kwargs):
+            return load()(request, *args, **kwargs)
+    view.__name__ = view.__qualname__ = dotted_path.rsplit('.', 1)[-1]
+    view.__module__ = dotted_path.rsplit('.', 1)[0]
+    view.csrf_exempt = csrf_exempt
+    return view
@@ -19,7 +19,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # --- Heroku/production imports ---
-import dj_database_url
+from .database import database_config
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 XERO_CLIENT_ID = '7C578E320B63424296114FEEA7272E56'
@@ -29,6 +29,11 @@ XERO_REDIRECT_URI = 'https://ff-group-815da21002bd.herokuapp.com/xero/callback'
 # Xero Tenant ID for Papamoa Beach
 XERO_TENANT_ID = '613cb02c-c997-49f9-bf2c-7b4eebb571d2'
 
+# Seconds before the stored Xero P&L snapshot is refreshed in the background
+XERO_ACTUALS_MAX_AGE = int(os.environ.get('XERO_ACTUALS_MAX_AGE', 6 * 60 * 60))
+# Parallel Xero report requests (Xero allows 5 concurrent calls per tenant)
+XERO_MAX_CONCURRENCY = int(os.environ.get('XERO_MAX_CONCURRENCY', 6))
+
 
 # Allow admin login via LocalXpose public URL
 CSRF_TRUSTED_ORIGINS = [
@@ -46,7 +51,8 @@ SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-%_9bu0t0afl+88vj)pz(@
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.environ.get('DEBUG', 'False').lower() in ('true', '1')
 
-ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+# Any host unless ALLOWED_HOSTS is set (django_heroku used to force '*')
+ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', '*').split(',')
 
 
 # Application definition
@@ -68,6 +74,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Serves collected static files (hashed names get immutable cache headers) before any other middleware runs
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -92,6 +100,8 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # {{ path|static }} without {% load %}, so the Flask app can render the same templates
+            'builtins': ['app.templatetags.assets'],
         },
     },
 ]
@@ -102,13 +112,26 @@ WSGI_APPLICATION = 'childcare_admin.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DATABASE_URL plus DB_POOL (persistent, psycopg or pgbouncer); see childcare_admin/database.py
 DATABASES = {
-    'default': dj_database_url.config(
-        default=f'sqlite:///{BASE_DIR / "db.sqlite3"}',
-        conn_max_age=600,
-        ssl_require=False
-    )
+    'default': database_config(os.environ, default_url=f'sqlite:///{BASE_DIR / "db.sqlite3"}'),
+}
+
+
+# Cache for the dashboard read APIs (see occupancy/cache.py) and the Xero refresh
+# guard. Local memory by default, which is per process: with more than one worker
+# (gunicorn-cfg.py runs one per CPU) set CACHE_BACKEND/CACHE_LOCATION to a shared
+# cache so writes invalidate every worker, e.g.
+# django.core.cache.backends.redis.RedisCache with redis://localhost:6379, or
+# django.core.cache.backends.db.DatabaseCache with api_cache (created by `migrate`).
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'childcare-admin'),
+    }
 }
+# Seconds a cached API response lives (also how stale another worker's local cache can get)
+API_CACHE_TIMEOUT = int(os.environ.get('API_CACHE_TIMEOUT', 60))
 
 
 # Password validation
@@ -155,14 +178,23 @@ STATICFILES_DIRS = [
 # For collectstatic in production
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# collectstatic writes content-hashed copies plus .gz/.br variants (see childcare_admin/storage.py);
+# {% static %} resolves to the hashed names, which WhiteNoise and nginx cache for a year
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'childcare_admin.storage.StaticFilesStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Heroku settings
-import django_heroku
-django_heroku.settings(locals())
+# Heroku CI's test runner. The rest of django_heroku.settings() (hosts, SECRET_KEY,
+# static files, database) is configured above; importing it here would load
+# django.test into every worker at startup
+if 'CI' in os.environ:
+    TEST_RUNNER = 'django_heroku.HerokuDiscoverRunner'
 
 # Redirect to dashboard after login
 LOGIN_REDIRECT_URL = "/"
@@ -19,8 +19,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.http import HttpResponse
 from django.shortcuts import render
-from app.ai_agent_api import AIChatView
-from occupancy.views import OccupancyByMonthView, OverdueInvoicesView, BudgetListView, xero_login, xero_callback, XeroActualsView
+from occupancy.views import OccupancyByMonthView, OccupancySeriesView, OccupancyRollupView, OccupancyForecastView, OverdueInvoicesView, OverdueTrendView, BudgetListView, GroupedBudgetView, BudgetVarianceView, DashboardView
+from .lazy import lazy_view
 
 def home(request):
     return HttpResponse("Welcome to the homepage!")
@@ -39,14 +39,22 @@ def ai_agent(request):
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/occupancy/', OccupancyByMonthView.as_view(), name='occupancy-by-month'),
+    path('api/occupancy/series/', OccupancySeriesView.as_view(), name='occupancy-series'),
+    path('api/occupancy/rollups/', OccupancyRollupView.as_view(), name='occupancy-rollups'),
+    path('api/occupancy/forecast/', OccupancyForecastView.as_view(), name='occupancy-forecast'),
     path('api/overdue-invoices/', OverdueInvoicesView.as_view(), name='overdue-invoices'),
+    path('api/overdue-invoices/trend/', OverdueTrendView.as_view(), name='overdue-invoices-trend'),
     path('api/budgets/', BudgetListView.as_view(), name='budget-list'),
+    path('api/budgets/grouped/', GroupedBudgetView.as_view(), name='budget-grouped'),
+    path('api/budget-variance/', BudgetVarianceView.as_view(), name='budget-variance'),
+    path('api/dashboard/', DashboardView.as_view(), name='dashboard-data'),
     path('', dashboard, name='dashboard'),
     path('xero/', xero_dashboard, name='xero_dashboard'),
     path('ai-agent/', ai_agent, name='ai_agent'),
-    path('api/ai-agent-chat/', AIChatView.as_view(), name='ai_agent_chat'),
-    path('xero/login/', xero_login, name='xero_login'),
-    path('xero/callback/', xero_callback, name='xero_callback'),
-    path('api/xero-actuals/', XeroActualsView.as_view(), name='xero-actuals'),
+    # Integrations are imported on their first request, keeping OpenAI, requests and httpx out of worker startup
+    path('api/ai-agent-chat/', lazy_view('app.ai_agent_api.AIChatView'), name='ai_agent_chat'),
+    path('xero/login/', lazy_view('occupancy.xero_views.xero_login'), name='xero_login'),
+    path('xero/callback/', lazy_view('occupancy.xero_views.xero_callback', is_async=True, csrf_exempt=True), name='xero_callback'),
+    path('api/xero-actuals/', lazy_view('occupancy.xero_views.AsyncXeroActualsView', is_async=True), name='xero-actuals'),
     path('accounts/', include('django.contrib.auth.urls')),  # Add Django auth URLs
 ]
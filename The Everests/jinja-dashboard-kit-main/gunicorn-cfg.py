@@ -1,11 +1,56 @@
 # -*- encoding: utf-8 -*-
 """
 Copyright (c) 2019 - present AppSeed.us
+
+Production gunicorn profile for the Django app: `gunicorn --config gunicorn-cfg.py`.
+
+Environment overrides:
+    PORT                   port to bind (default 5005, Heroku sets it)
+    GUNICORN_WORKER_CLASS  gthread (default, childcare_admin.wsgi) or uvicorn (childcare_admin.asgi)
+    WEB_CONCURRENCY        worker processes (default: CPU count; Heroku sets it per dyno size)
+    GUNICORN_THREADS       threads per gthread worker (default 4)
+    GUNICORN_MAX_REQUESTS  recycle a worker after this many requests, +/- 10% jitter (default 1000, 0 = never)
+    GUNICORN_TIMEOUT       seconds before a silent worker is restarted (default 30)
+    LOG_LEVEL              gunicorn log level (default info)
 """
+import multiprocessing
+import os
+
+cores = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5005')}"
+
+worker_class_name = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class_name == 'uvicorn':
+    # Async Xero views share one client per worker; see README "Serving"
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    wsgi_app = 'childcare_admin.asgi:application'
+else:
+    worker_class = 'gthread'
+    wsgi_app = 'childcare_admin.wsgi:application'
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+workers = int(os.environ.get('WEB_CONCURRENCY', cores))
+
+# Import Django and the project once in the master; workers fork with it loaded (integrations load on first use)
+preload_app = True
+
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
 
-bind = '0.0.0.0:5005'
-workers = 1
 accesslog = '-'
-loglevel = 'debug'
+# Request time in seconds (%(L)s) and the worker pid after the usual combined fields (gthread only;
+# uvicorn workers write uvicorn's own access lines)
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(L)ss %(p)s'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
 capture_output = True
 enable_stdio_inheritance = True
+
+
+def post_fork(server, worker):
+    # Don't share any database connection opened while preloading
+    from django.db import connections
+    connections.close_all()
@@ -0,0 +1,91 @@
+"""
+Load test for the dashboard APIs.
+
+Runs `--concurrency` clients against the given paths for `--duration` seconds and
+prints throughput and latency percentiles. To check that throughput scales with
+cores, run the server at different worker counts and compare the req/s line:
+
+    WEB_CONCURRENCY=1 gunicorn --config gunicorn-cfg.py
+    python loadtest.py http://localhost:5005 --concurrency 32 --duration 20
+
+    WEB_CONCURRENCY=4 gunicorn --config gunicorn-cfg.py
+    python loadtest.py http://localhost:5005 --concurrency 32 --duration 20
+
+By default every request carries a unique `_` query parameter so it misses the
+response cache and reaches the view; pass --cached to let the cache answer repeats.
+"""
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+
+import httpx
+
+DEFAULT_PATHS = [
+    '/api/dashboard/',
+    '/api/occupancy/series/',
+    '/api/overdue-invoices/',
+    '/api/budgets/grouped/',
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def run(base_url, paths, concurrency, duration, cached):
+    counter = itertools.count()
+    latencies, statuses, errors = [], {}, 0
+    deadline = time.monotonic() + duration
+
+    async def client(http):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            n = next(counter)
+            path = paths[n % len(paths)]
+            params = None if cached else {'_': n}
+            started = time.monotonic()
+            try:
+                response = await http.get(base_url + path, params=params)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.monotonic() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as http:
+        started = time.monotonic()
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+    return latencies, statuses, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('base_url', nargs='?', default='http://localhost:5005')
+    parser.add_argument('--path', action='append', dest='paths', help=f'Path to request (repeatable, default {", ".join(DEFAULT_PATHS)})')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--cached', action='store_true', help='Repeat identical URLs so the response cache answers')
+    args = parser.parse_args()
+
+    latencies, statuses, errors, elapsed = asyncio.run(
+        run(args.base_url.rstrip('/'), args.paths or DEFAULT_PATHS, args.concurrency, args.duration, args.cached)
+    )
+    total = len(latencies)
+    print(f"{total} requests in {elapsed:.2f}s with {args.concurrency} clients: {total / elapsed:.2f} req/s")
+    if latencies:
+        print(
+            f"latency ms: mean {statistics.mean(latencies) * 1000:.2f}  p50 {percentile(latencies, 50) * 1000:.2f}  "
+            f"p95 {percentile(latencies, 95) * 1000:.2f}  p99 {percentile(latencies, 99) * 1000:.2f}  max {max(latencies) * 1000:.2f}"
+        )
+    print(f"status codes: {dict(sorted(statuses.items()))}  connection errors: {errors}")
+
+
+if __name__ == '__main__':
+    main()
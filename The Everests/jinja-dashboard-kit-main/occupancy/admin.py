@@ -1,20 +1,20 @@
 from django.contrib import admin
-from .models import Centre, Occupancy, Budget
+from .models import Centre, Occupancy, Budget, OverdueSnapshot
 
 # Budget admin
 @admin.register(Budget)
 class BudgetAdmin(admin.ModelAdmin):
-    list_display = ("centre", "category", "year", "xero_account_code", "monthly_budget", "jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+    list_display = ("centre", "category", "year", "xero_account_code", "monthly_budget", "annual_total", "jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
     list_filter = ("centre", "category", "year")
     search_fields = ("category",)
 
 @admin.register(Centre)
 class CentreAdmin(admin.ModelAdmin):
-    list_display = ('name', 'api_id', 'moe_number', 'u2_licensed', 'total_licensed', 'nzbn')
+    list_display = ('name', 'api_id', 'moe_number', 'u2_licensed', 'total_licensed', 'region', 'nzbn', 'xero_tenant_id')
 
     fieldsets = (
         (None, {
-            'fields': ('name', 'api_id', 'moe_number', 'u2_licensed', 'total_licensed', 'nzbn'),
+            'fields': ('name', 'api_id', 'moe_number', 'u2_licensed', 'total_licensed', 'region', 'nzbn', 'xero_tenant_id'),
         }),
     )
 
@@ -28,3 +28,9 @@ class CentreAdmin(admin.ModelAdmin):
 class OccupancyAdmin(admin.ModelAdmin):
     list_display = ('centre', 'month_year', 'u2', 'o2', 'total')
     list_filter = ('centre', 'month_year')
+
+@admin.register(OverdueSnapshot)
+class OverdueSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('centre', 'amount', 'recorded_at')
+    list_filter = ('centre',)
+    date_hierarchy = 'recorded_at'
@@ -0,0 +1,115 @@
+"""
+Response cache for the dashboard read APIs.
+
+Responses are cached under the endpoint name, the query string and a generation
+number. Any write to the underlying models (see signals.py) or the end of an
+import/scrape command bumps the generation, so every older entry is skipped at
+once and left to expire.
+
+The backend is whatever CACHES['default'] is. Local memory (the default) is per
+process, so a write only invalidates the process it happened in, and other
+workers catch up within API_CACHE_TIMEOUT. Point CACHE_BACKEND at a shared cache
+(Redis, database) when running more than one worker, for immediate invalidation
+across workers and management commands.
+
+conditional() adds ETag/Last-Modified validators derived from each source table's
+row count and newest timestamp, so a repeat load with If-None-Match gets a 304
+without the view running at all.
+"""
+from functools import wraps
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework.response import Response
+
+GENERATION_KEY = 'api:generation'
+
+
+def generation():
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        cache.add(GENERATION_KEY, 1, None)
+        value = cache.get(GENERATION_KEY, 1)
+    return value
+
+
+def invalidate():
+    """Drop every cached API response by moving to a new generation."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 2, None)
+
+
+def response_key(name, request):
+    query = '&'.join(f'{k}={v}' for k, v in sorted(request.GET.lists()))
+    return f'api:{generation()}:{name}:{hashlib.md5(query.encode()).hexdigest()}'
+
+
+def cached_response(name, timeout=None):
+    """Decorate an APIView.get so successful responses are served from the cache."""
+    def decorator(get):
+        @wraps(get)
+        def wrapper(self, request, *args, **kwargs):
+            key = response_key(name, request)
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+            response = get(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, settings.API_CACHE_TIMEOUT if timeout is None else timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def _version_field(model):
+    names = {field.name for field in model._meta.get_fields()}
+    return next(name for name in ('updated_at', 'recorded_at', 'fetched_at', 'generated_at') if name in names)
+
+
+def table_versions(request, models):
+    """Row count and newest timestamp per model. Cached under the current generation
+    like the responses, and memoised on the request so the ETag and Last-Modified
+    callbacks share the lookups."""
+    versions = request.__dict__.setdefault('_table_versions', {})
+    for model in models:
+        if model not in versions:
+            key = f'api:{generation()}:version:{model._meta.label_lower}'
+            version = cache.get(key)
+            if version is None:
+                version = model.objects.aggregate(count=Count('pk'), last_modified=Max(_version_field(model)))
+                cache.set(key, version, settings.API_CACHE_TIMEOUT)
+            versions[model] = version
+    return [versions[model] for model in models]
+
+
+def conditional(*models):
+    """Decorate an APIView.get with ETag/Last-Modified validators for the tables it reads."""
+    def etag(request, *args, **kwargs):
+        parts = [
+            f"{v['count']}:{v['last_modified'].isoformat() if v['last_modified'] else ''}"
+            for v in table_versions(request, models)
+        ]
+        parts.append(request.META.get('QUERY_STRING', ''))
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        return max((v['last_modified'] for v in table_versions(request, models) if v['last_modified']), default=None)
+
+    def decorator(get):
+        get = method_decorator(condition(etag_func=etag, last_modified_func=last_modified))(get)
+
+        @wraps(get)
+        def wrapper(self, request, *args, **kwargs):
+            response = get(self, request, *args, **kwargs)
+            # Let browsers keep the body but always revalidate it
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,115 @@
+"""
+Occupancy forecasts and anomaly flags, computed by the forecast_occupancy command.
+
+Each centre's monthly total occupancy is fitted with ordinary least squares on a
+level + linear trend, plus month-of-year terms once there are enough months of
+history to estimate them. Every centre is fitted together: the series are pivoted
+into a months x centres matrix and solved in one lstsq call per distinct pattern
+of missing months (usually just one). Months whose residual is more than
+`threshold` residual standard deviations from the fit are flagged as anomalies.
+
+Views only read the stored OccupancyForecast rows; nothing here runs on a request.
+"""
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache
+from .models import Occupancy, OccupancyForecast
+
+
+def _design(ordinals, seasonal):
+    """Design matrix for month ordinals (year * 12 + month - 1)."""
+    columns = [np.ones(len(ordinals)), ordinals - ordinals[0]]
+    if seasonal:
+        month = ordinals % 12
+        columns += [(month == m).astype(float) for m in range(1, 12)]
+    return np.column_stack(columns)
+
+
+def fit(series, horizon=6, min_seasonal_months=24):
+    """
+    series: DataFrame of total occupancy, indexed by month ordinal (contiguous), one column per centre (NaN = missing).
+    Returns (fitted, future, sigma): fitted and future are DataFrames of expected values over the history
+    and the next `horizon` months, sigma the residual standard deviation per centre.
+    """
+    ordinals = series.index.to_numpy()
+    future_ordinals = np.arange(ordinals[-1] + 1, ordinals[-1] + 1 + horizon)
+    all_ordinals = np.concatenate([ordinals, future_ordinals])
+    values = series.to_numpy(dtype=float)
+    observed = ~np.isnan(values)
+
+    expected = np.full((len(all_ordinals), values.shape[1]), np.nan)
+    sigma = np.full(values.shape[1], np.nan)
+    # Centres with the same missing months share a design matrix and one solve
+    patterns = {}
+    for column, mask in enumerate(observed.T):
+        patterns.setdefault(mask.tobytes(), []).append(column)
+    for columns in patterns.values():
+        mask = observed[:, columns[0]]
+        n = mask.sum()
+        seasonal = n >= min_seasonal_months
+        X_all = _design(all_ordinals, seasonal)
+        X = X_all[:len(ordinals)][mask]
+        if n <= X.shape[1]:
+            continue  # too little history to fit (and estimate the spread)
+        Y = values[mask][:, columns]
+        beta, *_ = np.linalg.lstsq(X, Y, rcond=None)
+        residuals = Y - X @ beta
+        sigma[columns] = np.sqrt((residuals ** 2).sum(axis=0) / (n - X.shape[1]))
+        expected[:, columns] = X_all @ beta
+
+    expected = np.clip(expected, 0, None)
+    fitted = pd.DataFrame(expected[:len(ordinals)], index=ordinals, columns=series.columns)
+    future = pd.DataFrame(expected[len(ordinals):], index=future_ordinals, columns=series.columns)
+    return fitted, future, pd.Series(sigma, index=series.columns)
+
+
+def _period(ordinal):
+    year, month = divmod(int(ordinal), 12)
+    return year * 100 + month + 1
+
+
+def _ordinal(period):
+    year, month = divmod(period, 100)
+    return year * 12 + month - 1
+
+
+def run(horizon=6, threshold=2.0, min_seasonal_months=24):
+    """Fit every centre and replace the stored forecasts. Returns the number of rows written."""
+    rows = Occupancy.objects.filter(period__isnull=False).values_list('centre_id', 'period', 'total')
+    frame = pd.DataFrame.from_records(list(rows), columns=['centre_id', 'period', 'total'])
+    if frame.empty:
+        return 0
+    frame['ordinal'] = frame['period'].map(_ordinal)
+    series = frame.pivot_table(index='ordinal', columns='centre_id', values='total', aggfunc='mean')
+    series = series.reindex(np.arange(series.index.min(), series.index.max() + 1))
+    fitted, future, sigma = fit(series, horizon, min_seasonal_months)
+
+    band = threshold * sigma
+    generated_at = timezone.now()
+    forecasts = []
+    for expected, is_future in ((fitted, False), (future, True)):
+        for centre_id in expected.columns:
+            if np.isnan(sigma[centre_id]):
+                continue
+            for ordinal, value in expected[centre_id].items():
+                actual = None if is_future else series.at[ordinal, centre_id]
+                if not is_future and np.isnan(actual):
+                    continue
+                forecasts.append(OccupancyForecast(
+                    centre_id=centre_id,
+                    period=_period(ordinal),
+                    expected=round(value, 2),
+                    lower=round(max(value - band[centre_id], 0), 2),
+                    upper=round(value + band[centre_id], 2),
+                    actual=None if actual is None else round(actual, 2),
+                    anomaly=bool(actual is not None and abs(actual - value) > band[centre_id]),
+                    generated_at=generated_at,
+                ))
+    with transaction.atomic():
+        OccupancyForecast.objects.all().delete()
+        OccupancyForecast.objects.bulk_create(forecasts, batch_size=500)
+    cache.invalidate()
+    return len(forecasts)
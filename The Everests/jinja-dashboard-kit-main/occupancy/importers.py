@@ -0,0 +1,361 @@
+"""
+Streaming import pipeline for occupancy and budget files.
+
+Rows are read lazily from CSV or XLSX, the header is mapped to model fields once,
+and each row is validated in a generator. Valid rows are upserted in fixed-size
+chunks, so memory stays bounded by the chunk size rather than the file size.
+Rows that fail validation are written to an optional rejects CSV with the reason.
+"""
+import csv
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+import os
+import re
+import zipfile
+from xml.etree import ElementTree
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import rollups
+from .models import MONTH_FIELDS, Budget, BudgetLine, Centre, Occupancy, month_year_to_period, period_to_month_year
+
+XLSX_NS = {
+    'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+    'rel': 'http://schemas.openxmlformats.org/package/2006/relationships',
+}
+OFFICE_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+# Excel stores dates as days since 1899-12-30
+EXCEL_EPOCH = date(1899, 12, 30)
+
+
+class ImportFormatError(Exception):
+    """Raised when a file can't be read or its header doesn't have the required columns."""
+
+
+class RowError(Exception):
+    """Raised by a validator when a single row is invalid; the row is rejected, not the file."""
+
+
+def _normalise(name):
+    # 'centreName', '﻿centreName ' and 'Centre Name' all become 'centrename'
+    return re.sub(r'[^a-z0-9]', '', (name or '').lower())
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from csv.reader(f)
+
+
+def _column_index(ref):
+    letters = ''.join(ch for ch in ref if ch.isalpha())
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch.upper()) - ord('A') + 1
+    return index - 1
+
+
+def _first_sheet_path(archive):
+    workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    sheet = workbook.find('main:sheets/main:sheet', XLSX_NS)
+    rels = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels.findall('rel:Relationship', XLSX_NS):
+        if rel.get('Id') == sheet.get(OFFICE_REL):
+            target = rel.get('Target').lstrip('/')
+            return target if target.startswith('xl/') else f'xl/{target}'
+    raise ImportFormatError('Workbook has no worksheets')
+
+
+def read_xlsx(path):
+    """Yield the first worksheet's rows as lists of strings, streaming the sheet XML."""
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile as e:
+        raise ImportFormatError(f'{path} is not a valid XLSX file') from e
+    with archive:
+        shared = []
+        if 'xl/sharedStrings.xml' in archive.namelist():
+            with archive.open('xl/sharedStrings.xml') as f:
+                for _, elem in ElementTree.iterparse(f):
+                    if elem.tag == f"{{{XLSX_NS['main']}}}si":
+                        shared.append(''.join(t.text or '' for t in elem.iter(f"{{{XLSX_NS['main']}}}t")))
+                        elem.clear()
+        with archive.open(_first_sheet_path(archive)) as f:
+            for _, elem in ElementTree.iterparse(f):
+                if elem.tag != f"{{{XLSX_NS['main']}}}row":
+                    continue
+                values = []
+                for cell in elem.findall('main:c', XLSX_NS):
+                    index = _column_index(cell.get('r', '')) if cell.get('r') else len(values)
+                    values.extend([''] * (index - len(values)))
+                    kind = cell.get('t')
+                    if kind == 'inlineStr':
+                        value = ''.join(t.text or '' for t in cell.iter(f"{{{XLSX_NS['main']}}}t"))
+                    else:
+                        v = cell.find('main:v', XLSX_NS)
+                        value = v.text if v is not None and v.text is not None else ''
+                        if kind == 's' and value:
+                            value = shared[int(value)]
+                    values.append(value)
+                elem.clear()
+                yield values
+
+
+def read_rows(path):
+    """Yield raw rows (lists of strings) from a CSV or XLSX file."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        return read_xlsx(path)
+    if ext == '.numbers':
+        raise ImportFormatError('Numbers files must be exported first (File > Export To > CSV or Excel)')
+    return read_csv(path)
+
+
+def _to_int(value, field):
+    text = str(value).strip().rstrip('%')
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        raise RowError(f'{field} is not a number: {value!r}')
+    if number < 0 or number != number.to_integral_value():
+        raise RowError(f'{field} must be a whole number >= 0: {value!r}')
+    return int(number)
+
+
+def _to_decimal(value, field, required=True):
+    text = str(value or '').strip().replace('$', '').replace(',', '')
+    if not text:
+        if required:
+            raise RowError(f'{field} is required')
+        return None
+    try:
+        return Decimal(text).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RowError(f'{field} is not an amount: {value!r}')
+
+
+def _to_month_year(value):
+    """The stored YYYY-MM form of a month written as YYYY-MM, MM-YYYY or an XLSX date."""
+    text = str(value).strip()
+    # XLSX date cells arrive as serial day numbers
+    if re.fullmatch(r'\d{5}(\.0+)?', text):
+        day = EXCEL_EPOCH + timedelta(days=int(float(text)))
+        return period_to_month_year(day.year * 100 + day.month)
+    period = month_year_to_period(text)
+    if period is None:
+        raise RowError(f'month must be YYYY-MM or MM-YYYY: {value!r}')
+    return period_to_month_year(period)
+
+
+class Importer:
+    """Base pipeline: map the header once, validate rows lazily, upsert in chunks."""
+    model = None
+    # Model field -> accepted (normalised) header names
+    columns = {}
+    required = ()
+
+    def __init__(self, batch_size=500, rejects=None):
+        self.batch_size = batch_size
+        self.rejects = rejects
+        self.inserted = self.updated = self.skipped = 0
+        self._rejects_writer = None
+        self._header = None
+
+    def map_header(self, header):
+        lookup = {_normalise(name): i for i, name in enumerate(header)}
+        mapping = {}
+        for field, aliases in self.columns.items():
+            for alias in (field,) + aliases:
+                if _normalise(alias) in lookup:
+                    mapping[field] = lookup[_normalise(alias)]
+                    break
+        missing = [field for field in self.required if field not in mapping]
+        if missing:
+            raise ImportFormatError(f"Missing required column(s): {', '.join(missing)}")
+        return mapping
+
+    def reject(self, line, raw, reason):
+        self.skipped += 1
+        if self.rejects is None:
+            return
+        if self._rejects_writer is None:
+            self._rejects_writer = csv.writer(self.rejects)
+            self._rejects_writer.writerow(['line', 'error'] + list(self._header))
+        self._rejects_writer.writerow([line, reason] + list(raw))
+
+    def records(self, rows):
+        """Yield validated records, rejecting bad rows as they are read."""
+        rows = iter(rows)
+        for header in rows:
+            if any(str(cell).strip() for cell in header):
+                break
+        else:
+            raise ImportFormatError('File is empty')
+        self._header = header
+        mapping = self.map_header(header)
+        for line, raw in enumerate(rows, start=2):
+            if not any(str(cell).strip() for cell in raw):
+                continue
+            values = {field: (raw[i].strip() if i < len(raw) and raw[i] is not None else '') for field, i in mapping.items()}
+            missing = [field for field in self.required if not values.get(field)]
+            if missing:
+                self.reject(line, raw, f"missing {', '.join(missing)}")
+                continue
+            try:
+                yield self.validate(values)
+            except RowError as e:
+                self.reject(line, raw, str(e))
+
+    def run(self, rows):
+        chunk = {}
+        for record in self.records(rows):
+            key = self.key(record)
+            if key in chunk:
+                self.skipped += 1  # a later line for the same key replaces the earlier one
+            chunk[key] = record
+            if len(chunk) >= self.batch_size:
+                self.flush(list(chunk.values()))
+                chunk = {}
+        if chunk:
+            self.flush(list(chunk.values()))
+        return self
+
+    def summary(self):
+        return f'{self.inserted} inserted, {self.updated} updated, {self.skipped} skipped'
+
+
+class OccupancyImporter(Importer):
+    model = Occupancy
+    columns = {
+        'centre': ('centreName', 'centre name'),
+        'api_id': ('apiId', 'discover api'),
+        'month_year': ('month', 'month year', 'period'),
+        'u2': (),
+        'o2': (),
+        'total': (),
+    }
+    required = ('centre', 'month_year', 'u2', 'o2', 'total')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.centres = {}
+
+    def validate(self, values):
+        return {
+            'centre': values['centre'],
+            'api_id': values.get('api_id') or None,
+            'month_year': _to_month_year(values['month_year']),
+            'u2': _to_int(values['u2'], 'u2'),
+            'o2': _to_int(values['o2'], 'o2'),
+            'total': _to_int(values['total'], 'total'),
+        }
+
+    def key(self, record):
+        return record['centre'], record['month_year']
+
+    def resolve_centres(self, records):
+        api_ids = {r['centre']: r['api_id'] for r in records if r['api_id']}
+        names = {r['centre'] for r in records} - self.centres.keys()
+        if names:
+            self.centres.update({c.name: c for c in Centre.objects.filter(name__in=names)})
+            new_centres = [Centre(name=name, api_id=api_ids.get(name)) for name in names - self.centres.keys()]
+            if new_centres:
+                Centre.objects.bulk_create(new_centres)
+                # Re-select so primary keys are set on every backend
+                self.centres.update({c.name: c for c in Centre.objects.filter(name__in=[c.name for c in new_centres])})
+        changed = [self.centres[name] for name, api_id in api_ids.items() if self.centres[name].api_id != api_id]
+        for centre in changed:
+            centre.api_id = api_ids[centre.name]
+            centre.updated_at = timezone.now()
+        Centre.objects.bulk_update(changed, ['api_id', 'updated_at'])
+
+    @transaction.atomic
+    def flush(self, records):
+        self.resolve_centres(records)
+        rows = [
+            Occupancy(
+                centre=self.centres[r['centre']], month_year=r['month_year'],
+                period=month_year_to_period(r['month_year']), u2=r['u2'], o2=r['o2'], total=r['total'],
+            )
+            for r in records
+        ]
+        existing = set(
+            Occupancy.objects.filter(centre__in={row.centre for row in rows}, period__in={row.period for row in rows})
+            .values_list('centre_id', 'period')
+        )
+        updated = sum((row.centre.pk, row.period) in existing for row in rows)
+        Occupancy.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['centre', 'period'],
+            update_fields=['u2', 'o2', 'total', 'month_year', 'updated_at'],
+        )
+        rollups.refresh({row.period for row in rows})
+        self.updated += updated
+        self.inserted += len(rows) - updated
+
+
+class BudgetImporter(Importer):
+    model = Budget
+    columns = {
+        'centre': ('centreName', 'centre name'),
+        'category': (),
+        'year': (),
+        'monthly_budget': ('monthly', 'budget', 'default monthly budget'),
+        'xero_account_code': ('account code', 'xero code'),
+        **{month: () for month in MONTH_FIELDS},
+    }
+    required = ('centre', 'category', 'year', 'monthly_budget')
+    categories = {_normalise(value): value for value, _ in Budget.CATEGORY_CHOICES}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.centres = {}
+
+    def validate(self, values):
+        category = self.categories.get(_normalise(values['category']))
+        if category is None:
+            raise RowError(f"unknown category: {values['category']!r}")
+        record = {
+            'centre': values['centre'],
+            'category': category,
+            'year': _to_int(values['year'], 'year'),
+            'monthly_budget': _to_decimal(values['monthly_budget'], 'monthly_budget'),
+            'xero_account_code': values.get('xero_account_code') or None,
+        }
+        for month in MONTH_FIELDS:
+            record[month] = _to_decimal(values.get(month), month, required=False)
+        if not 2000 <= record['year'] <= 2100:
+            raise RowError(f"year out of range: {values['year']!r}")
+        if record['centre'] not in self.centres:
+            centre = Centre.objects.filter(name=record['centre']).first()
+            if centre is None:
+                raise RowError(f"unknown centre: {record['centre']!r}")
+            self.centres[record['centre']] = centre
+        return record
+
+    def key(self, record):
+        return record['centre'], record['category'], record['year']
+
+    @transaction.atomic
+    def flush(self, records):
+        rows = [
+            Budget(centre=self.centres[r['centre']], **{k: v for k, v in r.items() if k != 'centre'})
+            for r in records
+        ]
+        for row in rows:
+            row.annual_total = sum(row.effective_months())
+        in_chunk = Budget.objects.filter(centre__in={row.centre for row in rows}, year__in={row.year for row in rows})
+        existing = set(in_chunk.values_list('centre_id', 'category', 'year'))
+        keys = {(row.centre.pk, row.category, row.year) for row in rows}
+        updated = len(keys & existing)
+        Budget.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['centre', 'category', 'year'],
+            update_fields=['monthly_budget', 'xero_account_code', 'annual_total', 'updated_at'] + MONTH_FIELDS,
+        )
+        # bulk_create skips save(), so refresh the monthly lines here (re-selected for primary keys)
+        BudgetLine.sync([b for b in in_chunk if (b.centre_id, b.category, b.year) in keys])
+        self.updated += updated
+        self.inserted += len(rows) - updated
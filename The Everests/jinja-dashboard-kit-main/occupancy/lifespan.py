@@ -0,0 +1,35 @@
+"""
+ASGI lifespan events for childcare_admin.asgi, without importing anything at startup.
+
+Startup only marks the worker as running. Modules that keep a resource for the
+worker's lifetime (xero_async's shared httpx client) create it on first use
+while `running` is set and register a coroutine with on_shutdown() to close it,
+so an ASGI worker boots as light as a WSGI one.
+"""
+running = False
+_shutdown = []
+
+
+def on_shutdown(callback):
+    """Await `callback()` when the ASGI server shuts down."""
+    _shutdown.append(callback)
+
+
+def with_lifespan(app):
+    """Wrap an ASGI application so it answers lifespan startup/shutdown."""
+    async def application(scope, receive, send):
+        global running
+        if scope['type'] != 'lifespan':
+            return await app(scope, receive, send)
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                running = True
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                running = False
+                for callback in reversed(_shutdown):
+                    await callback()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    return application
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from occupancy import forecast
+
+
+class Command(BaseCommand):
+    help = 'Fit each centre\'s occupancy series, store forecasts for the next months and flag anomalous months'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=6, help='Months ahead to forecast')
+        parser.add_argument('--threshold', type=float, default=2.0, help='Flag months more than this many residual standard deviations from the fit')
+        parser.add_argument('--min-seasonal-months', type=int, default=24, help='History needed before month-of-year effects are fitted')
+
+    def handle(self, *args, **kwargs):
+        count = forecast.run(kwargs['months'], kwargs['threshold'], kwargs['min_seasonal_months'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} forecast rows.'))
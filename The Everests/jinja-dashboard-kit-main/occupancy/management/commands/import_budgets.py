@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from occupancy import cache
+from occupancy.importers import BudgetImporter, ImportFormatError, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import budgets (including the jan..dec monthly overrides) from a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', type=str, help='Path to the CSV or XLSX file')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk upsert chunk')
+        parser.add_argument('--rejects', help='Write rows that fail validation to this CSV with the reason')
+
+    def handle(self, *args, **kwargs):
+        rejects_path = kwargs['rejects']
+        rejects = open(rejects_path, 'w', newline='') if rejects_path else None
+        try:
+            importer = BudgetImporter(batch_size=kwargs['batch_size'], rejects=rejects).run(read_rows(kwargs['file']))
+        except ImportFormatError as e:
+            raise CommandError(str(e))
+        finally:
+            if rejects:
+                rejects.close()
+            cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'Imported budgets: {importer.summary()}.'))
+        if importer.skipped and rejects_path:
+            self.stdout.write(self.style.WARNING(f'Rejected rows written to {rejects_path}'))
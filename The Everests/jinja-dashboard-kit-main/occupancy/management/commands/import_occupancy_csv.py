@@ -1,18 +1,21 @@
 import csv
-from django.core.management.base import BaseCommand
-from occupancy.models import Centre, Occupancy
+from django.core.management.base import BaseCommand, CommandError
+from occupancy import cache
+from occupancy.importers import ImportFormatError, OccupancyImporter, read_rows
+from occupancy.models import Centre, Occupancy, month_year_to_period
 
 class Command(BaseCommand):
     help = 'Import occupancy data from CSV file'
 
     def add_arguments(self, parser):
         parser.add_argument('csv_file', type=str, help='Path to the CSV file')
+        parser.add_argument('--batch', action='store_true', help='Stream and validate the file (CSV or XLSX), bulk upserting rows in chunks')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk upsert chunk in --batch mode')
+        parser.add_argument('--rejects', help='In --batch mode, write rows that fail validation to this CSV with the reason')
 
-    def handle(self, *args, **kwargs):
-        csv_file = kwargs['csv_file']
+    def read_rows(self, csv_file):
         with open(csv_file, newline='') as f:
             reader = csv.DictReader(f)
-            count = 0
             for row in reader:
                 # Handle possible whitespace and case issues in header
                 centre_name = row.get('centreName') or row.get('\ufeffcentreName') or row.get('centreName '.strip()) or row.get('centreName'.strip())
@@ -23,20 +26,55 @@ class Command(BaseCommand):
                 total = row.get('total') or row.get('Total')
                 if not all([centre_name, month_year, u2, o2, total]):
                     self.stdout.write(self.style.WARNING(f'Skipped row due to missing data: {row}'))
+                    yield None
                     continue
-                centre, created = Centre.objects.get_or_create(name=centre_name.strip())
-                if api_id:
-                    centre.api_id = api_id.strip()
-                    centre.save()
-                occ, created = Occupancy.objects.get_or_create(
-                    centre=centre,
-                    month_year=month_year.strip(),
-                    defaults={'u2': int(u2), 'o2': int(o2), 'total': int(total)}
-                )
-                if not created:
-                    occ.u2 = int(u2)
-                    occ.o2 = int(o2)
-                    occ.total = int(total)
-                    occ.save()
-                count += 1
+                yield centre_name.strip(), (api_id or '').strip(), month_year.strip(), int(u2), int(o2), int(total)
+
+    def handle(self, *args, **kwargs):
+        csv_file = kwargs['csv_file']
+        if kwargs['batch']:
+            return self.handle_batch(csv_file, kwargs['batch_size'], kwargs['rejects'])
+        count = 0
+        for parsed in self.read_rows(csv_file):
+            if parsed is None:
+                continue
+            centre_name, api_id, month_year, u2, o2, total = parsed
+            period = month_year_to_period(month_year)
+            if period is None:
+                self.stdout.write(self.style.WARNING(f'Skipped row with month {month_year!r}: must be MM-YYYY or YYYY-MM'))
+                continue
+            centre, created = Centre.objects.get_or_create(name=centre_name)
+            if api_id and centre.api_id != api_id:
+                centre.api_id = api_id
+                centre.save(update_fields=['api_id', 'updated_at'])
+            # Matched on the month, whichever format the file and the stored row use
+            occ, created = Occupancy.objects.get_or_create(
+                centre=centre,
+                period=period,
+                defaults={'month_year': month_year, 'u2': u2, 'o2': o2, 'total': total}
+            )
+            if not created:
+                occ.u2 = u2
+                occ.o2 = o2
+                occ.total = total
+                occ.save()
+            count += 1
+        cache.invalidate()
         self.stdout.write(self.style.SUCCESS(f'Imported {count} occupancy records.'))
+
+    def handle_batch(self, csv_file, batch_size, rejects_path):
+        rejects = open(rejects_path, 'w', newline='') if rejects_path else None
+        try:
+            importer = OccupancyImporter(batch_size=batch_size, rejects=rejects).run(read_rows(csv_file))
+        except ImportFormatError as e:
+            raise CommandError(str(e))
+        finally:
+            if rejects:
+                rejects.close()
+            # bulk_create sends no signals; also covers chunks committed before an error
+            cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.inserted + importer.updated} occupancy records: {importer.summary()}.'
+        ))
+        if importer.skipped and rejects_path:
+            self.stdout.write(self.style.WARNING(f'Rejected rows written to {rejects_path}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from occupancy import rollups
+from occupancy.models import OccupancyRollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute every group and region occupancy rollup from the Occupancy table'
+
+    def handle(self, *args, **kwargs):
+        rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {OccupancyRollup.objects.count()} occupancy rollups.'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+import requests
+
+from occupancy import xero
+from occupancy.models import month_year_to_period
+
+
+class Command(BaseCommand):
+    help = 'Fetch the Xero Profit and Loss report and store monthly actuals per account (run on a schedule)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, default=timezone.now().year, help='Calendar year to fetch (default: current year)')
+        parser.add_argument('--from', dest='from', help='First month to fetch (YYYY-MM), overrides --year')
+        parser.add_argument('--to', help='Last month to fetch (YYYY-MM), overrides --year')
+
+    def handle(self, *args, **kwargs):
+        year = kwargs['year']
+        start, end = year * 100 + 1, year * 100 + 12
+        if kwargs['from']:
+            start = month_year_to_period(kwargs['from'])
+        if kwargs['to']:
+            end = month_year_to_period(kwargs['to'])
+        if start is None or end is None or start > end:
+            raise CommandError('--from/--to must be YYYY-MM (or MM-YYYY) with from <= to')
+        try:
+            count = xero.sync_actuals(start, end)
+        except (xero.XeroAuthError, xero.XeroAPIError, requests.RequestException) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} Xero actuals for {start}-{end}.'))
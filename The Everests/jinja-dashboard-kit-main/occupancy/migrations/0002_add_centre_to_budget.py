@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2025-08-05 02:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='centre',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to='occupancy.centre'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2025-08-05 02:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0002_add_centre_to_budget'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='budget',
+            name='centre',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to='occupancy.centre'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2025-08-05 02:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0003_budget_centre'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='budget',
+            unique_together={('centre', 'category', 'year')},
+        ),
+    ]
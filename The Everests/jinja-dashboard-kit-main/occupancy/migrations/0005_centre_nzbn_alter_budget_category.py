@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2025-08-07 21:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0004_alter_budget_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='centre',
+            name='nzbn',
+            field=models.CharField(blank=True, help_text='New Zealand Business Number for this centre/company.', max_length=20, null=True, verbose_name='NZBN'),
+        ),
+        migrations.AlterField(
+            model_name='budget',
+            name='category',
+            field=models.CharField(choices=[('Cleaning Supplies', 'Cleaning Supplies'), ('First Aid', 'First Aid'), ('Food Costs', 'Food Costs'), ('Kiri Classroom Resources', 'Kiri Classroom Resources'), ('Wai Classroom Resources', 'Wai Classroom Resources'), ('Nga Classroom Resources', 'Nga Classroom Resources'), ('Te Hui Classroom Resources', 'Te Hui Classroom Resources'), ('Centre Purcahses', 'Centre Purcahses'), ('Printing and Stationary', 'Printing and Stationary'), ('Art and Messy Play', 'Art and Messy Play'), ('Meeting Costs', 'Meeting Costs'), ('Nappies and Wipes', 'Nappies and Wipes'), ('Repairs and Maintenance', 'Repairs and Maintenance')], max_length=40),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2025-08-20 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0005_centre_nzbn_alter_budget_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='xero_account_code',
+            field=models.CharField(blank=True, help_text='Xero Chart of Account code for this budget line', max_length=20, null=True),
+        ),
+    ]
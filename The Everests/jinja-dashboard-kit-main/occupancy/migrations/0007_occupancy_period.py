@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+# Frozen copy of occupancy.models.month_year_to_period as of this migration
+def month_year_to_period(month_year):
+    if not month_year:
+        return None
+    parts = month_year.strip().split('-')
+    if len(parts) != 2 or not all(p.isdigit() for p in parts):
+        return None
+    if len(parts[0]) == 4:
+        year, month = parts
+    else:
+        month, year = parts
+    year, month = int(year), int(month)
+    if len(str(year)) != 4 or not 1 <= month <= 12:
+        return None
+    return year * 100 + month
+
+
+def backfill_period(apps, schema_editor):
+    Occupancy = apps.get_model('occupancy', 'Occupancy')
+    rows = list(Occupancy.objects.only('id', 'month_year'))
+    for row in rows:
+        row.period = month_year_to_period(row.month_year)
+    Occupancy.objects.bulk_update(rows, ['period'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0006_budget_xero_account_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='occupancy',
+            name='period',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Month as YYYYMM', null=True),
+        ),
+        migrations.RunPython(backfill_period, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='occupancy',
+            index=models.Index(fields=['period', 'centre'], name='occupancy_period_centre_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0008_occupancy_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XeroToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('access_token', models.TextField()),
+                ('refresh_token', models.TextField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(help_text='When the access token expires')),
+                ('tenant_id', models.CharField(blank=True, help_text='Xero tenant (organisation) ID', max_length=64, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
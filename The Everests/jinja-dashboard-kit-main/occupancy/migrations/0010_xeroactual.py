@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0009_xerotoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XeroActual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_id', models.CharField(help_text='Xero tenant (organisation) ID', max_length=64)),
+                ('account_code', models.CharField(max_length=20)),
+                ('year', models.PositiveIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('fetched_at', models.DateTimeField(help_text='When this snapshot was fetched from Xero')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['year', 'account_code'], name='xeroactual_year_code_idx')],
+                'unique_together': {('tenant_id', 'account_code', 'year', 'month')},
+            },
+        ),
+    ]
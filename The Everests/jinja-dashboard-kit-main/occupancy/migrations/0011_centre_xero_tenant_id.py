@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0010_xeroactual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='centre',
+            name='xero_tenant_id',
+            field=models.CharField(blank=True, help_text='Xero tenant (organisation) ID for this centre', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:10
+
+from decimal import Decimal, InvalidOperation
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+# Frozen copy of occupancy.models.parse_amount as of this migration
+def parse_amount(text):
+    if text is None:
+        return None
+    cleaned = str(text).strip().replace('$', '').replace(',', '').replace(' ', '')
+    negative = cleaned.startswith('(') and cleaned.endswith(')')
+    cleaned = cleaned.strip('()')
+    try:
+        amount = Decimal(cleaned).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+    return -amount if negative else amount
+
+
+def seed_from_centres(apps, schema_editor):
+    # Start each centre's history from the text the scraper last stored
+    Centre = apps.get_model('occupancy', 'Centre')
+    OverdueSnapshot = apps.get_model('occupancy', 'OverdueSnapshot')
+    snapshots = []
+    for centre in Centre.objects.exclude(overdue_invoice_amount__isnull=True).exclude(overdue_invoice_amount=''):
+        amount = parse_amount(centre.overdue_invoice_amount)
+        if amount is not None:
+            snapshots.append(OverdueSnapshot(centre=centre, amount=amount))
+    OverdueSnapshot.objects.bulk_create(snapshots)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0011_centre_xero_tenant_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('centre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overdue_snapshots', to='occupancy.centre')),
+            ],
+            options={
+                'ordering': ['-recorded_at'],
+                'get_latest_by': 'recorded_at',
+                'indexes': [models.Index(fields=['centre', '-recorded_at'], name='overdue_centre_recorded_idx')],
+            },
+        ),
+        migrations.RunPython(seed_from_centres, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+MONTH_FIELDS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+
+def backfill(apps, schema_editor):
+    Budget = apps.get_model('occupancy', 'Budget')
+    BudgetLine = apps.get_model('occupancy', 'BudgetLine')
+    budgets = list(Budget.objects.all())
+    lines = []
+    for budget in budgets:
+        months = [getattr(budget, m) if getattr(budget, m) is not None else budget.monthly_budget for m in MONTH_FIELDS]
+        budget.annual_total = sum(months)
+        lines.extend(BudgetLine(budget=budget, month=i, amount=amount) for i, amount in enumerate(months, start=1))
+    Budget.objects.bulk_update(budgets, ['annual_total'], batch_size=500)
+    BudgetLine.objects.bulk_create(lines, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0013_centre_budget_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='annual_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.CreateModel(
+            name='BudgetLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.PositiveSmallIntegerField(help_text='1 = January')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('budget', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='occupancy.budget')),
+            ],
+            options={
+                'ordering': ['budget', 'month'],
+                'unique_together': {('budget', 'month')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+# Frozen copy of the occupancy.rollups calculation as of this migration
+FIELDS = ('u2', 'o2', 'total')
+
+
+def shift_period(period, months):
+    year, month = divmod(period, 100)
+    year, month = divmod(year * 12 + month - 1 + months, 12)
+    return year * 100 + month + 1
+
+
+def monthly_rollups(rows):
+    sums = {}
+    for region, u2_licensed, total_licensed, period, *values in rows:
+        u2, total = u2_licensed or 0, total_licensed or 0
+        weights = (u2, max(total - u2, 0), total)
+        for scope in {'', region or ''}:
+            acc = sums.setdefault((scope, period), [0, [0] * 3, [0] * 3, [0] * 3])
+            acc[0] += 1
+            for i, (weight, value) in enumerate(zip(weights, values)):
+                acc[1][i] += weight
+                acc[2][i] += weight * value
+                acc[3][i] += value
+    return {
+        key: {
+            'centres': count,
+            **{
+                field: round(weighted[i] / weight[i] if weight[i] else plain[i] / count, 2)
+                for i, field in enumerate(FIELDS)
+            },
+        }
+        for key, (count, weight, weighted, plain) in sums.items()
+    }
+
+
+def add_rolling_averages(rollups):
+    for (scope, period), values in rollups.items():
+        for window in (3, 12):
+            months = [
+                rollups[(scope, p)] for p in (shift_period(period, -i) for i in range(window)) if (scope, p) in rollups
+            ]
+            for field in FIELDS:
+                values[f'{field}_avg_{window}'] = round(sum(float(m[field]) for m in months) / len(months), 2)
+    return rollups
+
+
+def build_rollups(apps, schema_editor):
+    Occupancy = apps.get_model('occupancy', 'Occupancy')
+    OccupancyRollup = apps.get_model('occupancy', 'OccupancyRollup')
+    rows = Occupancy.objects.exclude(period__isnull=True).values_list(
+        'centre__region', 'centre__u2_licensed', 'centre__total_licensed', 'period', 'u2', 'o2', 'total',
+    )
+    rollups = add_rolling_averages(monthly_rollups(rows))
+    OccupancyRollup.objects.bulk_create(
+        [OccupancyRollup(region=region, period=period, **values) for (region, period), values in rollups.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0014_budget_annual_total_budgetline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='centre',
+            name='region',
+            field=models.CharField(blank=True, help_text='Region for group occupancy rollups', max_length=50, null=True),
+        ),
+        migrations.CreateModel(
+            name='OccupancyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.CharField(blank=True, help_text='Blank for the whole group', max_length=50)),
+                ('period', models.PositiveIntegerField(help_text='Month as YYYYMM')),
+                ('centres', models.PositiveSmallIntegerField(help_text='Centres with data this month')),
+                ('u2', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('o2', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('u2_avg_3', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('u2_avg_12', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('o2_avg_3', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('o2_avg_12', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('total_avg_3', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('total_avg_12', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['region', 'period'],
+                'unique_together': {('region', 'period')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
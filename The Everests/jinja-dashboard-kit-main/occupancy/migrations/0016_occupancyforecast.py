@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0015_centre_region_occupancyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.PositiveIntegerField(help_text='Month as YYYYMM')),
+                ('expected', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('lower', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('upper', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('actual', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('anomaly', models.BooleanField(default=False, help_text='Actual is outside the expected band')),
+                ('generated_at', models.DateTimeField()),
+                ('centre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecasts', to='occupancy.centre')),
+            ],
+            options={
+                'ordering': ['centre', 'period'],
+                'unique_together': {('centre', 'period')},
+            },
+        ),
+    ]
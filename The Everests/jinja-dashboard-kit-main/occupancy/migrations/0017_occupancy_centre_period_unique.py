@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:20
+
+from importlib import import_module
+
+from django.db import migrations
+
+
+def merge_duplicate_months(apps, schema_editor):
+    # '2025-08' and '08-2025' were separate rows for the same centre and month; keep the
+    # most recently updated one and store every month_year as YYYY-MM, like most existing rows
+    Occupancy = apps.get_model('occupancy', 'Occupancy')
+    OccupancyRollup = apps.get_model('occupancy', 'OccupancyRollup')
+    seen, duplicates, renamed = set(), [], []
+    for row in Occupancy.objects.exclude(period__isnull=True).order_by('centre_id', 'period', '-updated_at', '-id'):
+        if (row.centre_id, row.period) in seen:
+            duplicates.append(row.pk)
+            continue
+        seen.add((row.centre_id, row.period))
+        month_year = f'{row.period // 100}-{row.period % 100:02d}'
+        if row.month_year != month_year:
+            row.month_year = month_year
+            renamed.append(row)
+    # Duplicates go first, so renaming can't collide with the old (centre, month_year) key
+    Occupancy.objects.filter(pk__in=duplicates).delete()
+    Occupancy.objects.bulk_update(renamed, ['month_year'], batch_size=500)
+    if duplicates:
+        # The duplicates were counted twice in the rollups
+        OccupancyRollup.objects.all().delete()
+        import_module('occupancy.migrations.0015_centre_region_occupancyrollup').build_rollups(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0016_occupancyforecast'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_months, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='occupancy',
+            unique_together={('centre', 'period')},
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:05
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # With CACHE_BACKEND set to the database cache (settings.CACHES), create its table with
+    # the schema so `migrate` is all a deploy needs. Skips existing tables; a no-op otherwise.
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('occupancy', '0017_occupancy_centre_period_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
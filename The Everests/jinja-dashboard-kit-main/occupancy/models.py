@@ -1,5 +1,12 @@
+from decimal import Decimal, InvalidOperation
+
 from django.db import models
-from django.db import models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+# Per-month override fields on Budget, January first
+MONTH_FIELDS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
 
 # Budget model for Xero categories
 class Budget(models.Model):
@@ -36,14 +43,56 @@ class Budget(models.Model):
     oct = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     nov = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     dec = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    # Sum of the effective monthly amounts, kept in sync on save (see also BudgetLine)
+    annual_total = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ("centre", "category", "year")
         ordering = ["category", "year"]
 
+    def effective_months(self):
+        """Budget for each month, January first: the override if set, else monthly_budget."""
+        return [getattr(self, month) if getattr(self, month) is not None else self.monthly_budget for month in MONTH_FIELDS]
+
+    def save(self, *args, **kwargs):
+        self.annual_total = sum(self.effective_months())
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'annual_total'}
+        super().save(*args, **kwargs)
+        BudgetLine.sync([self])
+
     def __str__(self):
         return f"{self.centre} - {self.category} - {self.year}"
 
+
+class BudgetLine(models.Model):
+    """Effective budget for one month of a Budget (override or default), one row per month."""
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='lines')
+    month = models.PositiveSmallIntegerField(help_text="1 = January")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        unique_together = ('budget', 'month')
+        ordering = ['budget', 'month']
+
+    @classmethod
+    def sync(cls, budgets):
+        """Upsert the twelve lines for each saved budget."""
+        cls.objects.bulk_create(
+            [
+                cls(budget=budget, month=month, amount=amount)
+                for budget in budgets
+                for month, amount in enumerate(budget.effective_months(), start=1)
+            ],
+            update_conflicts=True,
+            unique_fields=['budget', 'month'],
+            update_fields=['amount'],
+        )
+
+    def __str__(self):
+        return f"{self.budget} - {self.month:02d}: {self.amount}"
+
 class Centre(models.Model):
     name = models.CharField(max_length=100, unique=True)
     api_id = models.CharField(max_length=50, blank=True, null=True, unique=True, help_text="Discover API ID")
@@ -52,20 +101,206 @@ class Centre(models.Model):
     total_licensed = models.PositiveIntegerField(blank=True, null=True, help_text="Licensed Total children")
     nzbn = models.CharField("NZBN", max_length=20, blank=True, null=True, help_text="New Zealand Business Number for this centre/company.")
     overdue_invoice_amount = models.CharField(max_length=32, blank=True, null=True)
+    xero_tenant_id = models.CharField(max_length=64, blank=True, null=True, unique=True, help_text="Xero tenant (organisation) ID for this centre")
+    region = models.CharField(max_length=50, blank=True, null=True, help_text="Region for group occupancy rollups")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Fields the occupancy rollups are weighted and grouped by (see signals.py)
+    ROLLUP_FIELDS = frozenset({'region', 'u2_licensed', 'total_licensed'})
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The rollup inputs as loaded, so a save that leaves them alone skips the rollup rebuild
+        instance.loaded_rollup_values = {name: instance.__dict__[name] for name in cls.ROLLUP_FIELDS if name in instance.__dict__}
+        return instance
+
+def month_year_to_period(month_year):
+    """Convert a 'MM-YYYY' or 'YYYY-MM' string to an integer YYYYMM period.
+
+    Returns None if the value is not in either format.
+    """
+    if not month_year:
+        return None
+    parts = month_year.strip().split('-')
+    if len(parts) != 2 or not all(p.isdigit() for p in parts):
+        return None
+    if len(parts[0]) == 4:
+        year, month = parts
+    else:
+        month, year = parts
+    year, month = int(year), int(month)
+    if len(str(year)) != 4 or not 1 <= month <= 12:
+        return None
+    return year * 100 + month
+
+
+def period_to_month_year(period):
+    """Convert a YYYYMM period to the stored 'YYYY-MM' form."""
+    return f'{period // 100}-{period % 100:02d}'
+
+
 class Occupancy(models.Model):
     centre = models.ForeignKey(Centre, on_delete=models.CASCADE)
-    month_year = models.CharField(max_length=7)  # Format: MM-YYYY
+    month_year = models.CharField(max_length=7)  # Stored as YYYY-MM; MM-YYYY is accepted and converted on save
+    # Normalised month key (YYYYMM) so both month_year formats sort and filter the same way
+    period = models.PositiveIntegerField(blank=True, null=True, editable=False, help_text="Month as YYYYMM")
     u2 = models.PositiveSmallIntegerField(help_text="U2 occupancy percentage")
     o2 = models.PositiveSmallIntegerField(help_text="O2 occupancy percentage")
     total = models.PositiveSmallIntegerField(help_text="Total occupancy percentage")
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ('centre', 'month_year')
+        # Keyed on the month itself, so '2025-08' and '08-2025' can never be two rows
+        unique_together = ('centre', 'period')
         ordering = ['-month_year']
+        indexes = [
+            models.Index(fields=['period', 'centre'], name='occupancy_period_centre_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The month as loaded, so a save that moves the row can also refresh the month it left
+        instance.loaded_period = instance.__dict__.get('period')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.period = month_year_to_period(self.month_year)
+        if self.period is not None:
+            self.month_year = period_to_month_year(self.period)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.centre.name} - {self.month_year}"
+
+
+class XeroToken(models.Model):
+    """OAuth2 tokens for the connected Xero organisation (single row, shared by all workers)."""
+    access_token = models.TextField()
+    refresh_token = models.TextField(blank=True, null=True)
+    expires_at = models.DateTimeField(help_text="When the access token expires")
+    tenant_id = models.CharField(max_length=64, blank=True, null=True, help_text="Xero tenant (organisation) ID")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Xero token for {self.tenant_id} (expires {self.expires_at:%Y-%m-%d %H:%M})"
+
+
+class XeroActual(models.Model):
+    """Monthly P&L actual for one Xero account, stored by the sync_xero_actuals snapshot."""
+    tenant_id = models.CharField(max_length=64, help_text="Xero tenant (organisation) ID")
+    account_code = models.CharField(max_length=20)
+    year = models.PositiveIntegerField()
+    month = models.PositiveSmallIntegerField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    fetched_at = models.DateTimeField(help_text="When this snapshot was fetched from Xero")
+
+    class Meta:
+        unique_together = ('tenant_id', 'account_code', 'year', 'month')
+        indexes = [
+            models.Index(fields=['year', 'account_code'], name='xeroactual_year_code_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.account_code} {self.year}-{self.month:02d}: {self.amount}"
+
+
+def parse_amount(text):
+    """Convert scraped currency text like '$1,234.56' or '($12.00)' to a Decimal.
+
+    Returns None if the text isn't an amount.
+    """
+    if text is None:
+        return None
+    cleaned = str(text).strip().replace('$', '').replace(',', '').replace(' ', '')
+    negative = cleaned.startswith('(') and cleaned.endswith(')')
+    cleaned = cleaned.strip('()')
+    try:
+        amount = Decimal(cleaned).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+    return -amount if negative else amount
+
+
+class OverdueSnapshot(models.Model):
+    """Overdue invoices amount for a centre, recorded whenever the scraped value changes."""
+    centre = models.ForeignKey(Centre, on_delete=models.CASCADE, related_name='overdue_snapshots')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-recorded_at']
+        get_latest_by = 'recorded_at'
+        indexes = [
+            models.Index(fields=['centre', '-recorded_at'], name='overdue_centre_recorded_idx'),
+        ]
+
+    @classmethod
+    def latest_for_centres(cls):
+        """Centres annotated with their latest overdue amount and when it was recorded (one query)."""
+        latest = cls.objects.filter(centre=OuterRef('pk')).order_by('-recorded_at')
+        return Centre.objects.annotate(
+            overdue_amount=Subquery(latest.values('amount')[:1]),
+            overdue_recorded_at=Subquery(latest.values('recorded_at')[:1]),
+        )
+
+    @classmethod
+    def record(cls, centre, amount, recorded_at=None):
+        """Append a snapshot if the amount differs from the centre's latest one. Returns it, or None if unchanged."""
+        last = cls.objects.filter(centre=centre).order_by('-recorded_at').values_list('amount', flat=True).first()
+        if last == amount:
+            return None
+        return cls.objects.create(centre=centre, amount=amount, recorded_at=recorded_at or timezone.now())
+
+    def __str__(self):
+        return f"{self.centre} overdue {self.amount} at {self.recorded_at:%Y-%m-%d %H:%M}"
+
+
+class OccupancyRollup(models.Model):
+    """Licensed-capacity-weighted occupancy for the whole group (region '') or one region, per month."""
+    region = models.CharField(max_length=50, blank=True, help_text="Blank for the whole group")
+    period = models.PositiveIntegerField(help_text="Month as YYYYMM")
+    centres = models.PositiveSmallIntegerField(help_text="Centres with data this month")
+    u2 = models.DecimalField(max_digits=5, decimal_places=2)
+    o2 = models.DecimalField(max_digits=5, decimal_places=2)
+    total = models.DecimalField(max_digits=5, decimal_places=2)
+    u2_avg_3 = models.DecimalField(max_digits=5, decimal_places=2)
+    u2_avg_12 = models.DecimalField(max_digits=5, decimal_places=2)
+    o2_avg_3 = models.DecimalField(max_digits=5, decimal_places=2)
+    o2_avg_12 = models.DecimalField(max_digits=5, decimal_places=2)
+    total_avg_3 = models.DecimalField(max_digits=5, decimal_places=2)
+    total_avg_12 = models.DecimalField(max_digits=5, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('region', 'period')
+        ordering = ['region', 'period']
+
+    def __str__(self):
+        return f"{self.region or 'Group'} {self.period}: {self.total}%"
+
+
+class OccupancyForecast(models.Model):
+    """Expected total occupancy per centre and month from the forecast_occupancy job.
+
+    Past months carry the actual value and an anomaly flag; future months have no actual.
+    """
+    centre = models.ForeignKey(Centre, on_delete=models.CASCADE, related_name='forecasts')
+    period = models.PositiveIntegerField(help_text="Month as YYYYMM")
+    expected = models.DecimalField(max_digits=6, decimal_places=2)
+    lower = models.DecimalField(max_digits=6, decimal_places=2)
+    upper = models.DecimalField(max_digits=6, decimal_places=2)
+    actual = models.DecimalField(max_digits=6, decimal_places=2, blank=True, null=True)
+    anomaly = models.BooleanField(default=False, help_text="Actual is outside the expected band")
+    generated_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('centre', 'period')
+        ordering = ['centre', 'period']
+
+    def __str__(self):
+        return f"{self.centre} {self.period}: {self.expected}%"
@@ -0,0 +1,131 @@
+"""
+Group and region occupancy rollups.
+
+Each OccupancyRollup row holds one month's occupancy for the whole group
+(region '') or one region, weighted by licensed capacity: U2 by u2_licensed, O2
+by total_licensed - u2_licensed, total by total_licensed. If no centre in a
+scope has capacities recorded, that month falls back to a plain average.
+Rolling 3 and 12 month averages cover the calendar months in the trailing
+window that have data.
+
+refresh(periods) recomputes just the given months (and the rolling averages of
+the months after them), so an Occupancy write costs a few queries rather than a
+full rebuild.
+"""
+from django.db import transaction
+
+from . import cache
+from .models import Occupancy, OccupancyRollup
+
+FIELDS = ('u2', 'o2', 'total')
+WINDOWS = (3, 12)
+GROUP = ''
+
+
+def shift_period(period, months):
+    year, month = divmod(period, 100)
+    year, month = divmod(year * 12 + month - 1 + months, 12)
+    return year * 100 + month + 1
+
+
+def _weights(u2_licensed, total_licensed):
+    u2 = u2_licensed or 0
+    total = total_licensed or 0
+    return u2, max(total - u2, 0), total
+
+
+def monthly_rollups(rows):
+    """
+    rows: (region, u2_licensed, total_licensed, period, u2, o2, total) per centre-month.
+    Returns {(region, period): {'centres': n, 'u2': .., 'o2': .., 'total': ..}}, region '' being the group.
+    """
+    sums = {}
+    for region, u2_licensed, total_licensed, period, *values in rows:
+        weights = _weights(u2_licensed, total_licensed)
+        for scope in {GROUP, region or GROUP}:
+            acc = sums.setdefault((scope, period), [0, [0] * 3, [0] * 3, [0] * 3])
+            acc[0] += 1
+            for i, (weight, value) in enumerate(zip(weights, values)):
+                acc[1][i] += weight
+                acc[2][i] += weight * value
+                acc[3][i] += value
+    return {
+        key: {
+            'centres': count,
+            **{
+                field: round(weighted[i] / weight[i] if weight[i] else plain[i] / count, 2)
+                for i, field in enumerate(FIELDS)
+            },
+        }
+        for key, (count, weight, weighted, plain) in sums.items()
+    }
+
+
+def add_rolling_averages(rollups, periods=None):
+    """Set <field>_avg_3 and <field>_avg_12 on each rollup (or only those whose period is in `periods`)."""
+    for (scope, period), values in rollups.items():
+        if periods is not None and period not in periods:
+            continue
+        for window in WINDOWS:
+            months = [
+                rollups[(scope, p)] for p in (shift_period(period, -i) for i in range(window)) if (scope, p) in rollups
+            ]
+            for field in FIELDS:
+                values[f'{field}_avg_{window}'] = round(sum(float(m[field]) for m in months) / len(months), 2)
+    return rollups
+
+
+def _average_fields():
+    return [f'{field}_avg_{window}' for field in FIELDS for window in WINDOWS]
+
+
+def _centre_months(periods):
+    return (
+        Occupancy.objects.filter(period__in=periods)
+        .values_list('centre__region', 'centre__u2_licensed', 'centre__total_licensed', 'period', 'u2', 'o2', 'total')
+    )
+
+
+@transaction.atomic
+def refresh(periods):
+    """Recompute the rollups for `periods` and the rolling averages that include them."""
+    periods = {period for period in periods if period}
+    if not periods:
+        return
+    fresh = monthly_rollups(_centre_months(periods))
+    # Rolling averages of the next 11 months include these periods; they need 11 months before
+    first, last = min(periods), max(periods)
+    neighbours = OccupancyRollup.objects.filter(
+        period__gte=shift_period(first, -11), period__lte=shift_period(last, 11),
+    ).exclude(period__in=periods)
+    rollups = {
+        (region, period): {'centres': centres, **dict(zip(FIELDS, values))}
+        for region, period, centres, *values in neighbours.values_list('region', 'period', 'centres', *FIELDS)
+    }
+    rollups.update(fresh)
+    affected = {shift_period(period, i) for period in periods for i in range(12)}
+    add_rolling_averages(rollups, affected)
+
+    # Scopes with no data left in a refreshed month
+    stale = [
+        pk for pk, region, period in OccupancyRollup.objects.filter(period__in=periods).values_list('pk', 'region', 'period')
+        if (region, period) not in fresh
+    ]
+    OccupancyRollup.objects.filter(pk__in=stale).delete()
+    OccupancyRollup.objects.bulk_create(
+        [
+            OccupancyRollup(region=scope, period=period, **values)
+            for (scope, period), values in rollups.items() if period in affected
+        ],
+        update_conflicts=True,
+        unique_fields=['region', 'period'],
+        update_fields=['centres', *FIELDS, *_average_fields(), 'updated_at'],
+    )
+    cache.invalidate()
+
+
+def rebuild():
+    """Recompute every rollup from scratch (after capacity or region changes)."""
+    with transaction.atomic():
+        OccupancyRollup.objects.all().delete()
+        refresh(set(Occupancy.objects.values_list('period', flat=True).distinct()))
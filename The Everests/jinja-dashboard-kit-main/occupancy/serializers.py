@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.db.models import F
 from .models import Occupancy, Budget
 
 class OccupancySerializer(serializers.ModelSerializer):
@@ -20,3 +21,49 @@ class BudgetSerializer(serializers.ModelSerializer):
             'id', 'centre', 'centre_name', 'category', 'year', 'monthly_budget',
             'jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'
         ]
+
+
+class ValuesSerializer:
+    """Lean read-only serializer built on ``QuerySet.values()``.
+
+    Mirrors the output of the matching ModelSerializer, but fetches each row
+    (including joined centre columns) in a single query and skips DRF's
+    per-field machinery.
+    """
+    fields = ()
+    # Output name -> ORM lookup for joined columns, e.g. {'centre_name': 'centre__name'}
+    related_fields = {}
+    # Rendered as strings, matching DRF's default DecimalField output
+    decimal_fields = ()
+
+    def __init__(self, queryset, many=True):
+        self.queryset = queryset
+
+    @property
+    def data(self):
+        lookups = {name: F(path) for name, path in self.related_fields.items()}
+        rows = self.queryset.values(*self.fields, **lookups)
+        output = []
+        for row in rows:
+            for name in self.decimal_fields:
+                if row[name] is not None:
+                    row[name] = str(row[name])
+            output.append(row)
+        return output
+
+
+class OccupancyValuesSerializer(ValuesSerializer):
+    fields = ('id', 'month_year', 'u2', 'o2', 'total')
+    related_fields = {'centre_name': 'centre__name', 'discover_api': 'centre__api_id'}
+
+
+class BudgetValuesSerializer(ValuesSerializer):
+    fields = (
+        'id', 'centre', 'category', 'year', 'monthly_budget',
+        'jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'
+    )
+    related_fields = {'centre_name': 'centre__name'}
+    decimal_fields = (
+        'monthly_budget',
+        'jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'
+    )
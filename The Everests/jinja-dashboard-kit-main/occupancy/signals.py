@@ -0,0 +1,39 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache, rollups
+from .models import Budget, Centre, Occupancy, OverdueSnapshot
+
+
+# Bulk writes (queryset.update, bulk_create) don't send these; the import and
+# scrape commands call cache.invalidate() themselves when they finish.
+@receiver([post_save, post_delete], sender=Centre)
+@receiver([post_save, post_delete], sender=Occupancy)
+@receiver([post_save, post_delete], sender=Budget)
+@receiver([post_save, post_delete], sender=OverdueSnapshot)
+def invalidate_api_cache(sender, **kwargs):
+    cache.invalidate()
+
+
+# Rollups are refreshed once the write commits; bulk imports refresh their periods directly.
+# An edit that changes month_year refreshes the month the row left as well.
+@receiver([post_save, post_delete], sender=Occupancy)
+def refresh_occupancy_rollups(sender, instance, **kwargs):
+    periods = {instance.period, getattr(instance, 'loaded_period', None)}
+    instance.loaded_period = instance.period
+    transaction.on_commit(partial(rollups.refresh, periods))
+
+
+@receiver(post_save, sender=Centre)
+def rebuild_occupancy_rollups(sender, instance, created, update_fields=None, **kwargs):
+    # Capacity or region changes reweight every month; other centre edits (and saves
+    # that change nothing) don't. A centre that wasn't loaded from the database counts as changed.
+    saved = Centre.ROLLUP_FIELDS if update_fields is None else Centre.ROLLUP_FIELDS & set(update_fields)
+    loaded = instance.__dict__.setdefault('loaded_rollup_values', {})
+    changed = [name for name in saved if name not in loaded or loaded[name] != getattr(instance, name)]
+    loaded.update((name, getattr(instance, name)) for name in saved)
+    if changed and not created:
+        transaction.on_commit(rollups.rebuild)
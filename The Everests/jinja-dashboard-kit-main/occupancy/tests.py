@@ -1,3 +1,843 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from importlib import import_module
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import httpx
+from rest_framework.test import APIRequestFactory
+import uvicorn
+
+from childcare_admin.asgi import application
+
+from . import cache as api_cache, forecast, xero, xero_async
+from .importers import BudgetImporter, OccupancyImporter
+from .models import Budget, BudgetLine, Centre, Occupancy, OccupancyForecast, OccupancyRollup, OverdueSnapshot, XeroActual, XeroToken, parse_amount
+from .serializers import BudgetSerializer, OccupancySerializer
+from .variance import compute_variance
+from .xero_views import XeroActualsView
+from .views import (
+    BudgetListView, DashboardView, GroupedBudgetView, OccupancyByMonthView, OccupancyForecastView, OccupancyRollupView,
+    OccupancySeriesView, OverdueInvoicesView, OverdueTrendView,
+)
+
+# Query counts cover the app's own queries, whichever CACHE_BACKEND the suite runs with
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'}}
+
+
+def write_csv(rows):
+    """Write rows to a temporary CSV file and return its path."""
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as f:
+        csv.writer(f).writerows(rows)
+    return f.name
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class QueryCountTestCase(TestCase):
+    """Calls a view with growing row counts and checks the query count stays fixed."""
+
+    factory = APIRequestFactory()
+    # What make_rows creates for each centre: any of 'occupancy', 'budgets', 'overdue'
+    sections = ()
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, view, params):
+        response = view.as_view()(self.factory.get('/', params))
+        response.render()
+        return response
+
+    def make_rows(self, size):
+        """Centres 'Centre 0'..'Centre {size-1}' with this class's sections; calling again with a larger size adds centres."""
+        for i in range(size):
+            centre, _ = Centre.objects.get_or_create(name=f'Centre {i}', defaults={'api_id': f'api-{i}'})
+            if 'occupancy' in self.sections:
+                Occupancy.objects.update_or_create(centre=centre, month_year='2025-07', defaults={'u2': 80, 'o2': 90, 'total': 85})
+            if 'budgets' in self.sections:
+                Budget.objects.update_or_create(
+                    centre=centre, category='Food Costs', year=2025,
+                    defaults={'monthly_budget': Decimal('250.00'), 'mar': Decimal('300.50')},
+                )
+            if 'overdue' in self.sections:
+                # Two snapshots each, so "latest" has something to choose between; the latest is i + 1
+                OverdueSnapshot.record(centre, Decimal(i))
+                OverdueSnapshot.record(centre, Decimal(i) + 1)
+
+    def assertFixedQueryCount(self, view, params, num, sizes=(1, 6, 30)):
+        for size in sizes:
+            self.make_rows(size)
+            with self.subTest(rows=size), self.assertNumQueries(num):
+                response = self.get(view, params)
+            self.assertEqual(response.status_code, 200)
+
+
+class OccupancyQueryCountTests(QueryCountTestCase):
+    sections = ('occupancy',)
+
+    # One version query per source table (Occupancy, Centre) plus the data query
+    def test_by_month_is_one_query(self):
+        self.assertFixedQueryCount(OccupancyByMonthView, {'month_year': '07-2025'}, 3)
+
+    def test_range_is_one_query(self):
+        self.assertFixedQueryCount(OccupancyByMonthView, {'from': '2025-01', 'to': '2025-12'}, 3)
+
+    def test_series_is_one_query(self):
+        self.assertFixedQueryCount(OccupancySeriesView, {'from': '2025-01'}, 3)
+
+    def test_series_groups_by_centre_over_contiguous_months(self):
+        self.make_rows(2)
+        later = Centre.objects.get(name='Centre 1')
+        Occupancy.objects.create(centre=later, month_year='09-2025', u2=70, o2=75, total=72)
+        data = self.get(OccupancySeriesView, {}).data
+        self.assertEqual(data['months'], ['2025-07', '2025-08', '2025-09'])
+        self.assertEqual([centre['name'] for centre in data['centres']], ['Centre 0', 'Centre 1'])
+        self.assertEqual(data['total'], [[85, None, None], [85, None, 72]])
+        self.assertEqual(data['u2'][1], [80, None, 70])
+        with self.assertNumQueries(0):  # served from the response cache
+            self.assertEqual(self.get(OccupancySeriesView, {}).data, data)
+
+        data = self.get(OccupancySeriesView, {'from': '2025-08', 'to': '2025-12'}).data
+        self.assertEqual((data['months'], data['centres']), (['2025-09'], [{'id': later.id, 'name': 'Centre 1'}]))
+        self.assertEqual(self.get(OccupancySeriesView, {'from': '2025-13'}).status_code, 400)
+
+    def test_matches_model_serializer(self):
+        self.make_rows(3)
+        expected = OccupancySerializer(Occupancy.objects.filter(period=202507), many=True).data
+        response = self.get(OccupancyByMonthView, {'month_year': '2025-07'})
+        self.assertEqual(sorted(response.data, key=lambda r: r['id']), sorted(expected, key=lambda r: r['id']))
+
+
+class OccupancyRangeTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.papamoa = Centre.objects.create(name='Papamoa Beach')
+        self.bayfair = Centre.objects.create(name='Bayfair')
+        # Written in both month_year formats (stored as YYYY-MM)
+        for centre, month_year, total in [
+            (self.papamoa, '12-2024', 70), (self.papamoa, '2025-01', 71), (self.papamoa, '02-2025', 72),
+            (self.bayfair, '2025-01', 81), (self.bayfair, '03-2025', 83),
+        ]:
+            Occupancy.objects.create(centre=centre, month_year=month_year, u2=total, o2=total, total=total)
+
+    def totals(self, params):
+        return [(row['centre_name'], row['total']) for row in self.get(OccupancyByMonthView, params).data]
+
+    def test_range_orders_by_month_then_centre(self):
+        self.assertEqual(
+            self.totals({'from': '2025-01', 'to': '2025-02'}),
+            [('Bayfair', 81), ('Papamoa Beach', 71), ('Papamoa Beach', 72)],
+        )
+        self.assertEqual(self.totals({'to': '2025-01'}), [('Papamoa Beach', 70), ('Bayfair', 81), ('Papamoa Beach', 71)])
+        self.assertEqual(self.totals({'from': '2025-02', 'centre': 'Bayfair'}), [('Bayfair', 83)])
+
+    def test_both_month_formats_are_the_same_period(self):
+        self.assertEqual(self.totals({'from': '01-2025', 'to': '02-2025'}), self.totals({'from': '2025-01', 'to': '2025-02'}))
+        self.assertEqual(self.totals({'month_year': '01-2025'}), self.totals({'month_year': '2025-01'}))
+        self.assertEqual(sorted(self.totals({'month_year': '01-2025'})), [('Bayfair', 81), ('Papamoa Beach', 71)])
+        self.assertEqual(self.get(OccupancyByMonthView, {'from': '2025-13'}).status_code, 400)
+
+    def test_backfill_migration_sets_period(self):
+        backfill = import_module('occupancy.migrations.0007_occupancy_period').backfill_period
+        # Rows from before month_year was normalised may still be MM-YYYY
+        Occupancy.objects.filter(month_year='2024-12').update(month_year='12-2024')
+        Occupancy.objects.update(period=None)
+        backfill(django_apps, None)
+        self.assertEqual(
+            sorted(Occupancy.objects.values_list('month_year', 'period')),
+            [('12-2024', 202412), ('2025-01', 202501), ('2025-01', 202501), ('2025-02', 202502), ('2025-03', 202503)],
+        )
+
+
+class BudgetQueryCountTests(QueryCountTestCase):
+    sections = ('budgets',)
+
+    def test_list_is_one_query(self):
+        self.assertFixedQueryCount(BudgetListView, {'year': '2025'}, 3)
+
+    def test_matches_model_serializer(self):
+        self.make_rows(3)
+        expected = BudgetSerializer(Budget.objects.all(), many=True).data
+        response = self.get(BudgetListView, {})
+        self.assertEqual(sorted(response.data, key=lambda r: r['id']), sorted(expected, key=lambda r: r['id']))
+
+    def test_grouped_is_fixed_query_count(self):
+        # Budget and Centre version queries plus the data query
+        self.assertFixedQueryCount(GroupedBudgetView, {'year': '2025'}, 3)
+
+    def test_grouped_resolves_monthly_overrides(self):
+        self.make_rows(2)
+        centre = Centre.objects.get(name='Centre 0')
+        data = self.get(GroupedBudgetView, {'year': '2025'}).data
+        food = data['centres'][centre.id]['budgets']['Food Costs']
+        self.assertEqual(food['months'][:3], ['250.00', '250.00', '300.50'])
+        self.assertEqual(food['annual'], '3050.50')
+        self.assertEqual(food['months'], [f'{m:.2f}' for m in Budget.objects.get(centre=centre).effective_months()])
+
+    def test_lines_and_annual_total_follow_saves(self):
+        self.make_rows(1)
+        budget = Budget.objects.get()
+        self.assertEqual(budget.annual_total, Decimal('3050.50'))
+        budget.mar = None
+        budget.dec = Decimal('0.00')
+        budget.save()
+        lines = dict(BudgetLine.objects.filter(budget=budget).values_list('month', 'amount'))
+        self.assertEqual((lines[3], lines[12], len(lines)), (Decimal('250.00'), Decimal('0.00'), 12))
+        self.assertEqual(Budget.objects.get().annual_total, Decimal('2750.00'))
+
+
+class OccupancyRollupTests(QueryCountTestCase):
+    def test_capacity_weighted_and_incremental(self):
+        big = Centre.objects.create(name='Big', u2_licensed=20, total_licensed=80, region='Coast')
+        small = Centre.objects.create(name='Small', u2_licensed=10, total_licensed=20, region='Inland')
+        with self.captureOnCommitCallbacks(execute=True):
+            Occupancy.objects.create(centre=big, month_year='2025-01', u2=100, o2=80, total=85)
+            Occupancy.objects.create(centre=small, month_year='2025-01', u2=50, o2=50, total=50)
+            Occupancy.objects.create(centre=big, month_year='2025-02', u2=100, o2=100, total=100)
+        group = OccupancyRollup.objects.get(region='', period=202501)
+        # U2 (100*20 + 50*10) / 30, O2 (80*60 + 50*10) / 70, total (85*80 + 50*20) / 100
+        self.assertEqual((group.u2, group.o2, group.total, group.centres), (Decimal('83.33'), Decimal('75.71'), Decimal('78.00'), 2))
+        self.assertEqual(OccupancyRollup.objects.get(region='', period=202502).total_avg_3, Decimal('89.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Occupancy.objects.filter(centre=small).get().delete()
+        self.assertEqual(OccupancyRollup.objects.get(region='', period=202501).total, Decimal('85.00'))
+        self.assertEqual(OccupancyRollup.objects.get(region='', period=202502).total_avg_3, Decimal('92.50'))
+        self.assertFalse(OccupancyRollup.objects.filter(region='Inland').exists())
+
+        data = self.get(OccupancyRollupView, {'from': '2025-01'}).data
+        self.assertEqual(data['months'], ['2025-01', '2025-02'])
+        self.assertEqual([scope['region'] for scope in data['scopes']], [None, 'Coast'])
+        self.assertEqual(data['scopes'][0]['total'], [85.0, 100.0])
+
+    def test_moving_a_row_refreshes_the_month_it_left(self):
+        coast = Centre.objects.create(name='Coast', region='R')
+        inland = Centre.objects.create(name='Inland')
+        with self.captureOnCommitCallbacks(execute=True):
+            Occupancy.objects.create(centre=coast, month_year='2025-07', u2=80, o2=80, total=80)
+            Occupancy.objects.create(centre=inland, month_year='2025-07', u2=60, o2=60, total=60)
+        row = Occupancy.objects.get(centre=coast)
+        row.month_year = '08-2025'
+        with self.captureOnCommitCallbacks(execute=True):
+            row.save()
+        rollups = {(r.region, r.period): (r.centres, r.total) for r in OccupancyRollup.objects.all()}
+        self.assertEqual(rollups, {
+            ('', 202507): (1, Decimal('60.00')),
+            ('', 202508): (1, Decimal('80.00')),
+            ('R', 202508): (1, Decimal('80.00')),
+        })
+
+    @mock.patch('occupancy.rollups.rebuild')
+    def test_centre_saves_rebuild_only_when_capacity_or_region_change(self, rebuild):
+        Centre.objects.create(name='Coast', total_licensed=50)
+        centre = Centre.objects.get()
+        for change in ({'api_id': 'centre-1'}, {'nzbn': '9429000000000'}, {'total_licensed': 60}, {'region': 'Bay'}):
+            for name, value in change.items():
+                setattr(centre, name, value)
+            with self.captureOnCommitCallbacks(execute=True):
+                centre.save()
+        self.assertEqual(rebuild.call_count, 2)
+
+    @mock.patch('occupancy.rollups.rebuild')
+    def test_legacy_csv_import_does_not_rebuild_per_row(self, rebuild):
+        path = write_csv([['centreName', 'apiId', 'Month', 'U2', 'O2', 'Total']] + [
+            ['Coast', 'centre-1', f'2025-{month:02d}', '80', '90', '85'] for month in range(1, 13)
+        ])
+        self.addCleanup(os.remove, path)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_occupancy_csv', path, stdout=io.StringIO())
+        self.assertEqual(Occupancy.objects.count(), 12)
+        rebuild.assert_not_called()
+
+
+class ForecastTests(QueryCountTestCase):
+    def test_trend_forecast_and_anomaly(self):
+        centres = [Centre.objects.create(name=f'Centre {i}') for i in range(3)]
+        for month in range(1, 13):
+            for i, centre in enumerate(centres):
+                # Rising one point a month, with one bad month at the first centre
+                total = 20 if (i, month) == (0, 6) else 60 + i + month
+                Occupancy.objects.create(centre=centre, month_year=f'2024-{month:02d}', u2=total, o2=total, total=total)
+        forecast.run(horizon=3, threshold=2.0)
+
+        flagged = OccupancyForecast.objects.filter(anomaly=True)
+        self.assertEqual(list(flagged.values_list('centre__name', 'period')), [('Centre 0', 202406)])
+        future = OccupancyForecast.objects.get(centre=centres[1], period=202501)
+        self.assertIsNone(future.actual)
+        self.assertAlmostEqual(float(future.expected), 74.0, places=1)
+
+        with self.assertNumQueries(2):  # version + data, nothing fitted on request
+            data = self.get(OccupancyForecastView, {'centre_id': centres[1].id}).data
+        self.assertEqual(data['months'][-3:], ['2025-01', '2025-02', '2025-03'])
+        self.assertEqual(data['centres'][0]['actual'][-1], None)
+
+
+class VarianceTests(TestCase):
+    def test_ytd_and_projection(self):
+        centre = Centre.objects.create(name='Papamoa Beach', xero_tenant_id='tenant-1')
+        Budget.objects.create(centre=centre, category='Food Costs', year=2025, monthly_budget=Decimal('100'), mar=Decimal('150'), xero_account_code='400')
+        Budget.objects.create(centre=centre, category='First Aid', year=2025, monthly_budget=Decimal('10'))
+        for month in range(1, 7):
+            XeroActual.objects.create(tenant_id='tenant-1', account_code='400', year=2025, month=month, amount=Decimal('120'), fetched_at=timezone.now())
+        with self.assertNumQueries(2):
+            result = compute_variance([2025], 202506)
+        food = next(row for row in result['rows'] if row['category'] == 'Food Costs')
+        self.assertEqual((food['ytd_budget'], food['ytd_actual'], food['ytd_variance']), (650.0, 720.0, -70.0))
+        self.assertEqual((food['annual_budget'], food['burn_rate'], food['projected_overspend']), (1250.0, 120.0, 190.0))
+        self.assertEqual(result['totals'][0]['annual_budget'], 1370.0)
+        self.assertEqual(result['centres'][0]['ytd_actual'], 720.0)
+
+
+class OverdueSnapshotTests(QueryCountTestCase):
+    sections = ('overdue',)
+
+    def test_latest_is_fixed_query_count(self):
+        self.assertFixedQueryCount(OverdueInvoicesView, {}, 3)
+
+    def test_record_only_on_change(self):
+        centre = Centre.objects.create(name='Papamoa Beach')
+        self.assertIsNotNone(OverdueSnapshot.record(centre, parse_amount('$1,234.56')))
+        self.assertIsNone(OverdueSnapshot.record(centre, parse_amount('1234.56')))
+        self.assertIsNotNone(OverdueSnapshot.record(centre, parse_amount('($10.00)')))
+        self.assertEqual(list(centre.overdue_snapshots.values_list('amount', flat=True)), [Decimal('-10.00'), Decimal('1234.56')])
+
+    def test_total_comes_from_latest_amounts(self):
+        self.make_rows(3)
+        Centre.objects.create(name='No history')
+        data = self.get(OverdueInvoicesView, {}).data
+        self.assertEqual(data['total'], '6.00')
+        self.assertEqual(data['centres'][0]['overdue_invoice_amount'], '1.00')
+        self.assertEqual(data['centres'][-1]['overdue_invoice_amount'], '0.00')
+
+    def test_trend_is_fixed_query_count(self):
+        self.assertFixedQueryCount(OverdueTrendView, {}, 3)
+
+    def test_trend_lists_each_change_in_order(self):
+        beach = Centre.objects.create(name='Papamoa Beach')
+        bay = Centre.objects.create(name='Bay')
+        for centre, day, amount in ((beach, 1, '10'), (beach, 2, '10'), (bay, 2, '7'), (beach, 3, '20'), (beach, 5, '5')):
+            OverdueSnapshot.record(centre, Decimal(amount), timezone.make_aware(datetime(2025, 1, day, 12)))
+
+        def trend(**params):
+            return [(c['name'], [s['amount'] for s in c['series']]) for c in self.get(OverdueTrendView, params).data['centres']]
+
+        # Centres by name, each change once (day 2's unchanged beach amount isn't stored), oldest first
+        self.assertEqual(trend(), [('Bay', ['7.00']), ('Papamoa Beach', ['10.00', '20.00', '5.00'])])
+        series = self.get(OverdueTrendView, {'centre_id': beach.id}).data['centres'][0]['series']
+        self.assertEqual([s['recorded_at'].day for s in series], [1, 3, 5])
+        self.assertEqual(trend(**{'from': '2025-01-02', 'to': '2025-01-04'}), [('Bay', ['7.00']), ('Papamoa Beach', ['20.00'])])
+        self.assertEqual(self.get(OverdueTrendView, {'from': '01-2025'}).status_code, 400)
+
+
+class DashboardTests(QueryCountTestCase):
+    sections = ('occupancy', 'budgets', 'overdue')
+
+    # Four version queries (Occupancy, OverdueSnapshot, Budget, Centre) plus one per section
+    def test_one_query_per_section(self):
+        self.assertFixedQueryCount(DashboardView, {'year': 2025}, 7)
+        cache.clear()
+        self.assertFixedQueryCount(DashboardView, {'fields': 'overdue'}, 5, sizes=(3,))
+
+    def test_sections_match_their_endpoints(self):
+        self.make_rows(3)
+        data = self.get(DashboardView, {'fields': 'overdue,budgets', 'year': 2025}).data
+        self.assertEqual(set(data), {'overdue', 'budgets'})
+        self.assertEqual(data['overdue'], self.get(OverdueInvoicesView, {}).data)
+        self.assertEqual(data['budgets'], self.get(GroupedBudgetView, {'year': 2025}).data)
+        self.assertEqual(self.get(DashboardView, {'fields': 'occupancy,nope'}).status_code, 400)
+
+
+class ResponseCacheTests(QueryCountTestCase):
+    def test_cached_until_a_write(self):
+        centre = Centre.objects.create(name='Papamoa Beach')
+        Occupancy.objects.create(centre=centre, month_year='2025-07', u2=80, o2=90, total=85)
+        params = {'month_year': '2025-07'}
+        self.get(OccupancyByMonthView, params)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(OccupancyByMonthView, params).data[0]['total'], 85)
+        Occupancy.objects.filter(centre=centre).get().delete()
+        self.assertEqual(self.get(OccupancyByMonthView, params).data, [])
+
+    def test_keyed_by_query(self):
+        centre = Centre.objects.create(name='Papamoa Beach')
+        Budget.objects.create(centre=centre, category='Food Costs', year=2025, monthly_budget=Decimal('250.00'))
+        self.assertEqual(len(self.get(BudgetListView, {'year': '2025'}).data), 1)
+        self.assertEqual(len(self.get(BudgetListView, {'year': '2024'}).data), 0)
+
+    def test_not_modified(self):
+        centre = Centre.objects.create(name='Papamoa Beach')
+        Occupancy.objects.create(centre=centre, month_year='2025-07', u2=80, o2=90, total=85)
+        params = {'month_year': '2025-07'}
+        response = self.get(OccupancyByMonthView, params)
+        self.assertIn('no-cache', response['Cache-Control'])
+        request = self.factory.get('/', params, HTTP_IF_NONE_MATCH=response['ETag'])
+        with self.assertNumQueries(0):
+            self.assertEqual(OccupancyByMonthView.as_view()(request).status_code, 304)
+        centre.name = 'Renamed'
+        centre.save()
+        self.assertEqual(OccupancyByMonthView.as_view()(request).status_code, 200)
+
+
+# Run the suite with CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache to include this
+@skipUnless(settings.CACHES['default']['BACKEND'].endswith('.DatabaseCache'), 'needs a database CACHE_BACKEND')
+class SharedCacheTests(TestCase):
+    def test_generation_is_stored_for_every_worker(self):
+        # Workers and management commands all read the generation from this table,
+        # so an invalidate() in any of them reaches the others
+        api_cache.invalidate()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT cache_key FROM {settings.CACHES['default']['LOCATION']}")
+            self.assertIn(cache.make_key(api_cache.GENERATION_KEY), [key for key, in cursor.fetchall()])
+
+
+class ImporterTests(TestCase):
+    def test_occupancy_rejects_bad_rows_and_upserts(self):
+        rows = [
+            ['\ufeffcentreName ', 'Month', 'U2', 'O2', 'Total'],
+            ['Papamoa Beach', '2025-07', '80', '90', '85%'],
+            ['Papamoa Beach', '2025-13', '80', '90', '85'],
+            ['Papamoa Beach', '2025-08', 'n/a', '90', '85'],
+        ]
+        rejects = io.StringIO()
+        importer = OccupancyImporter(batch_size=1, rejects=rejects).run(rows)
+        self.assertEqual((importer.inserted, importer.updated, importer.skipped), (1, 0, 2))
+        self.assertEqual(Occupancy.objects.get().period, 202507)
+        self.assertEqual(len(rejects.getvalue().splitlines()), 3)
+
+        importer = OccupancyImporter().run(rows[:2])
+        self.assertEqual((importer.inserted, importer.updated), (0, 1))
+
+    def test_month_formats_upsert_one_row(self):
+        Occupancy.objects.create(centre=Centre.objects.create(name='Papamoa Beach'), month_year='08-2025', u2=1, o2=1, total=1)
+        rows = [['centreName', 'Month', 'U2', 'O2', 'Total'], ['Papamoa Beach', '2025-08', '80', '90', '85']]
+        importer = OccupancyImporter().run(rows)
+        # An XLSX date cell (15 Aug 2025) is the same month again
+        importer = OccupancyImporter().run([rows[0], ['Papamoa Beach', '45884', '81', '91', '86']])
+        self.assertEqual((importer.inserted, importer.updated), (0, 1))
+        self.assertEqual(list(Occupancy.objects.values_list('month_year', 'period', 'total')), [('2025-08', 202508, 86)])
+
+    def test_budget_monthly_overrides(self):
+        centre = Centre.objects.create(name='Papamoa Beach')
+        rows = [
+            ['Centre', 'Category', 'Year', 'Monthly Budget', 'Mar'],
+            ['Papamoa Beach', 'food costs', '2025', '$1,200', '1300'],
+            ['Unknown', 'Food Costs', '2025', '100', ''],
+        ]
+        importer = BudgetImporter().run(rows)
+        self.assertEqual(importer.skipped, 1)
+        budget = Budget.objects.get(centre=centre)
+        self.assertEqual((budget.category, budget.monthly_budget, budget.mar, budget.apr), ('Food Costs', Decimal('1200.00'), Decimal('1300.00'), None))
+        self.assertEqual(budget.annual_total, Decimal('14500.00'))
+        self.assertEqual(budget.lines.get(month=3).amount, Decimal('1300.00'))
+
+
+class ImportCommandTests(TestCase):
+    def run_import(self, rows, batch_size):
+        """Run import_occupancy_csv --batch on rows; returns (output, queries run)."""
+        path = write_csv([['centreName', 'Month', 'U2', 'O2', 'Total'], *rows])
+        self.addCleanup(os.remove, path)
+        out = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('import_occupancy_csv', path, '--batch', '--batch-size', str(batch_size), stdout=out)
+        return out.getvalue(), len(queries)
+
+    def test_batch_mode_updates_existing_rows_in_place(self):
+        for i in range(4):
+            centre = Centre.objects.create(name=f'Centre {i}')
+            for month in range(1, 11):
+                Occupancy.objects.create(centre=centre, month_year=f'2025-{month:02d}', u2=1, o2=1, total=1)
+        ids = set(Occupancy.objects.values_list('id', flat=True))
+        # The stored rows are YYYY-MM; the file writes the same months as MM-YYYY
+        rows = [[f'Centre {i}', f'{month:02d}-2025', '80', '90', '85'] for i in range(4) for month in range(1, 11)]
+
+        output, one_chunk = self.run_import(rows[:10], batch_size=10)
+        self.assertIn('0 inserted, 10 updated', output)
+        output, four_chunks = self.run_import(rows, batch_size=10)
+        self.assertIn('0 inserted, 40 updated', output)
+        output, forty_row_chunk = self.run_import(rows, batch_size=40)
+        self.assertIn('0 inserted, 40 updated', output)
+
+        self.assertEqual(set(Occupancy.objects.values_list('id', flat=True)), ids)
+        self.assertEqual(set(Occupancy.objects.values_list('month_year', 'u2', 'o2', 'total')), {
+            (f'2025-{month:02d}', 80, 90, 85) for month in range(1, 11)
+        })
+        # Queries grow with the number of chunks, not rows
+        self.assertEqual(forty_row_chunk, one_chunk)
+        self.assertLessEqual(four_chunks, 4 * one_chunk)
+
+
+def pl_row(code, *values):
+    return {'RowType': 'Row', 'Cells': [{'Value': code, 'Attributes': [{'Name': 'AccountCode', 'Value': code}]}, *({'Value': v} for v in values)]}
+
+
+def pl_report(*rows, header=None):
+    if header is not None:
+        rows = ({'RowType': 'Header', 'Cells': [{'Value': ''}, *({'Value': h} for h in header)]},) + rows
+    return {'Reports': [{'Rows': list(rows)}]}
+
+
+class XeroReportTests(SimpleTestCase):
+    def test_report_requests_chunk_by_twelve_months(self):
+        year = xero.month_periods(202501, 202512)
+        self.assertEqual(xero.report_requests(year), [
+            (year, {'fromDate': '2025-12-01', 'toDate': '2025-12-31', 'timeframe': 'MONTH', 'periods': 11}),
+        ])
+        thirteen = xero.month_periods(202402, 202502)
+        (first, first_query), (second, second_query) = xero.report_requests(thirteen)
+        self.assertEqual((first[0], first[-1], first_query['toDate'], first_query['periods']), (202402, 202501, '2025-01-31', 11))
+        # A one-month chunk is anchored on that month and asks for no comparison periods
+        self.assertEqual((second, second_query), ([202502], {'fromDate': '2025-02-01', 'toDate': '2025-02-28', 'timeframe': 'MONTH'}))
+
+    def parse(self, data, chunk):
+        index = {period: i for i, period in enumerate(chunk)}
+        return xero.parse_profit_and_loss(data, chunk, index, {})
+
+    def test_columns_follow_the_header(self):
+        chunk = [202501, 202502, 202503]
+        data = pl_report(pl_row('400', '1', '3', '2'), header=['Jan 2025', '31 Mar 25', 'Feb-25'])
+        self.assertEqual(self.parse(data, chunk), {'400': [1.0, 2.0, 3.0]})
+
+    def test_unreadable_headings_fall_back_to_newest_first(self):
+        chunk = [202501, 202502, 202503]
+        self.assertEqual(self.parse(pl_report(pl_row('400', '30', '20', '10')), chunk), {'400': [10.0, 20.0, 30.0]})
+        data = pl_report(pl_row('400', '30', '20', '10'), header=['Mar 2025', 'Budget', 'Jan 2025'])
+        self.assertEqual(self.parse(data, chunk), {'400': [10.0, 20.0, 30.0]})
+
+    def test_nested_sections_and_repeated_codes(self):
+        data = pl_report(
+            {'RowType': 'Section', 'Rows': [
+                pl_row('400', '5'),
+                {'RowType': 'Section', 'Rows': [pl_row('400', '2.50'), pl_row('410', '')]},
+                {'RowType': 'SummaryRow', 'Cells': [{'Value': 'Total'}, {'Value': '7.50'}]},
+            ]},
+            header=['Jan 2025'],
+        )
+        self.assertEqual(self.parse(data, [202501]), {'400': [7.5], '410': [0.0]})
+
+    def test_malformed_reports_raise_api_error(self):
+        for data in ({}, {'Reports': []}, pl_report(pl_row('400', 'n/a'))):
+            with self.subTest(data=data), self.assertRaises(xero.XeroAPIError):
+                self.parse(data, [202501])
+
+
+def token_response(status=200, **tokens):
+    return mock.Mock(status_code=status, text='error' if status != 200 else '', json=mock.Mock(return_value=tokens))
+
+
+class XeroTokenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(xero.requests, 'post')
+        self.post = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def store(self, expires_in, refresh_token='refresh-1'):
+        XeroToken.objects.create(
+            access_token='access-1', refresh_token=refresh_token, tenant_id='tenant-1',
+            expires_at=timezone.now() + timedelta(seconds=expires_in),
+        )
+
+    @override_settings(CACHES=LOCAL_CACHE)
+    def test_cached_token_needs_no_queries(self):
+        xero.store_tokens({'access_token': 'access-1', 'refresh_token': 'refresh-1', 'expires_in': 1800}, 'tenant-1')
+        with self.assertNumQueries(0):
+            self.assertEqual(xero.get_token()['access_token'], 'access-1')
+        self.post.assert_not_called()
+
+    def test_refreshes_once_inside_the_margin_and_keeps_the_rotated_token(self):
+        self.store(expires_in=60)  # inside REFRESH_MARGIN
+        self.post.return_value = token_response(access_token='access-2', refresh_token='refresh-2', expires_in=1800)
+        self.assertEqual(xero.get_token()['access_token'], 'access-2')
+        self.assertEqual(xero.get_token()['access_token'], 'access-2')
+        self.post.assert_called_once()
+        self.assertEqual(self.post.call_args.kwargs['data']['refresh_token'], 'refresh-1')
+        self.assertEqual(XeroToken.objects.get().refresh_token, 'refresh-2')
+
+        # No refresh token in the response: the stored one is kept
+        XeroToken.objects.update(expires_at=timezone.now())
+        cache.clear()
+        self.post.return_value = token_response(access_token='access-3', expires_in=1800)
+        self.assertEqual(xero.get_token()['access_token'], 'access-3')
+        self.assertEqual(XeroToken.objects.get().refresh_token, 'refresh-2')
+
+    def test_skips_refresh_already_done_by_another_worker(self):
+        # This worker's cache still has the expiring token; the row was refreshed while it waited for the lock
+        cache.set(xero.TOKEN_CACHE_KEY, {'access_token': 'stale', 'tenant_id': 'tenant-1', 'expires_at': timezone.now()})
+        self.store(expires_in=1800)
+        self.assertEqual(xero.get_token()['access_token'], 'access-1')
+        self.assertEqual(xero._refresh()['access_token'], 'access-1')
+        self.post.assert_not_called()
+
+    def test_unusable_tokens_raise_auth_error(self):
+        with self.assertRaises(xero.XeroAuthError):
+            xero.get_token()  # never connected
+        self.store(expires_in=0, refresh_token=None)
+        with self.assertRaises(xero.XeroAuthError):
+            xero.get_token()
+        self.post.assert_not_called()
+        XeroToken.objects.update(refresh_token='refresh-1')
+        self.post.return_value = token_response(status=400)
+        with self.assertRaises(xero.XeroAuthError), self.assertLogs('occupancy.xero', 'ERROR'):
+            xero.get_token()
+        self.assertEqual(XeroToken.objects.get().access_token, 'access-1')
+
+
+def api_response(status=200, data=None, headers=None):
+    return mock.Mock(status_code=status, headers=headers or {}, text=f'status {status}', json=mock.Mock(return_value=data))
+
+
+class XeroFetchTests(TestCase):
+    """Report requests against a mocked requests session."""
+
+    def setUp(self):
+        cache.clear()
+        self.session = mock.Mock()
+        for patcher in (mock.patch.object(xero, 'get_session', return_value=self.session), mock.patch.object(xero.time, 'sleep')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        xero.store_tokens({'access_token': 'access-1', 'expires_in': 1800}, 'tenant-1')
+
+    def test_retries_429_with_capped_retry_after(self):
+        report = pl_report(pl_row('400', '250'), header=['Jan 2025'])
+        self.session.get.side_effect = [api_response(429, headers={'Retry-After': '600'}), api_response(data=report)]
+        with self.assertLogs('occupancy.xero', 'WARNING'):
+            self.assertEqual(xero.fetch_profit_and_loss([202501], 'tenant-1', 'access-1'), {'400': [250.0]})
+        self.assertEqual(self.session.get.call_count, 2)
+        xero.time.sleep.assert_called_once_with(xero.MAX_RETRY_AFTER)
+
+    def test_gives_up_after_max_retries(self):
+        self.session.get.return_value = api_response(429, headers={'Retry-After': '1'})
+        with self.assertLogs('occupancy.xero', 'WARNING'), self.assertRaises(xero.XeroAPIError):
+            xero.fetch_profit_and_loss([202501], 'tenant-1', 'access-1')
+        self.assertEqual(self.session.get.call_count, xero.MAX_RETRIES + 1)
+
+    def test_failing_tenant_does_not_stop_the_others(self):
+        Centre.objects.create(name='Good', xero_tenant_id='tenant-good')
+        Centre.objects.create(name='Bad', xero_tenant_id='tenant-bad')
+        XeroActual.objects.create(tenant_id='tenant-bad', account_code='400', year=2025, month=1, amount=Decimal('1'), fetched_at=timezone.now())
+
+        def get(url, params, headers, timeout):
+            if headers['xero-tenant-id'] == 'tenant-bad':
+                return api_response(500)
+            return api_response(data=pl_report(pl_row('400', '250'), header=['Jan 2025']))
+
+        self.session.get.side_effect = get
+        with self.assertLogs('occupancy.xero', 'ERROR') as logs:
+            self.assertEqual(xero.sync_actuals(202501, 202501), 1)
+        self.assertIn('tenant-bad', logs.output[0])
+        # The failed tenant keeps its previous snapshot
+        self.assertEqual(
+            sorted(XeroActual.objects.values_list('tenant_id', 'amount')),
+            [('tenant-bad', Decimal('1.00')), ('tenant-good', Decimal('250.00'))],
+        )
+
+
+class XeroSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def actual(self, tenant_id, period, amount, fetched_at=None):
+        return XeroActual.objects.create(
+            tenant_id=tenant_id, account_code='400', year=period // 100, month=period % 100,
+            amount=Decimal(amount), fetched_at=fetched_at or timezone.now(),
+        )
+
+    def test_stale_snapshot_is_served_while_one_refresh_runs(self):
+        fetched_at = timezone.now() - timedelta(seconds=settings.XERO_ACTUALS_MAX_AGE + 60)
+        self.actual('tenant-1', 202501, '250', fetched_at)
+        factory = APIRequestFactory()
+        with mock.patch.object(xero.threading, 'Thread') as thread, mock.patch.object(xero, 'sync_actuals') as sync:
+            for _ in range(2):
+                response = XeroActualsView.as_view()(factory.get('/', {'from': '2025-01', 'to': '2025-01'}))
+                self.assertEqual((response.status_code, response.data['fetched_at']), (200, fetched_at))
+        sync.assert_not_called()  # nothing fetched inline
+        thread.assert_called_once_with(target=xero._background_sync, args=(202501, 202501), daemon=True)
+        thread.return_value.start.assert_called_once()
+
+    def test_store_replaces_only_the_fetched_tenants_in_the_window(self):
+        self.actual('tenant-1', 202412, '1')
+        self.actual('tenant-1', 202501, '2')
+        self.actual('tenant-2', 202501, '3')
+        stored = xero.store_actuals(202501, 202502, [202501, 202502], {'tenant-1': {'410': [10.0, 20.0]}}, {'tenant-2': 'failed'})
+        self.assertEqual(stored, 2)
+        self.assertEqual(sorted(XeroActual.objects.values_list('tenant_id', 'account_code', 'year', 'month', 'amount')), [
+            ('tenant-1', '400', 2024, 12, Decimal('1.00')),
+            ('tenant-1', '410', 2025, 1, Decimal('10.00')),
+            ('tenant-1', '410', 2025, 2, Decimal('20.00')),
+            ('tenant-2', '400', 2025, 1, Decimal('3.00')),
+        ])
+        with self.assertRaisesMessage(xero.XeroAPIError, 'failed'):
+            xero.store_actuals(202501, 202501, [202501], {}, {'tenant-1': 'failed'})
+        self.assertEqual(XeroActual.objects.count(), 4)
+
+    def test_centre_actuals_come_from_its_own_tenant_only(self):
+        self.actual('tenant-1', 202501, '250')
+        self.actual('tenant-2', 202501, '100')
+        linked = Centre.objects.create(name='Linked', xero_tenant_id='tenant-2')
+        unlinked = Centre.objects.create(name='Unlinked')
+        for centre in (linked, unlinked):
+            Budget.objects.create(centre=centre, category='Food Costs', year=2025, monthly_budget=Decimal('300'), xero_account_code='400')
+        factory = APIRequestFactory()
+
+        def get(centre):
+            return XeroActualsView.as_view()(factory.get('/', {'from': '2025-01', 'to': '2025-01', 'centre_id': centre.id}))
+
+        self.assertEqual(get(linked).data['actuals'], {'400': [100.0]})
+        response = get(unlinked)
+        self.assertEqual((response.status_code, response.data['error']), (409, 'Unlinked is not linked to a Xero organisation'))
+
+
+class XeroLoginTests(SimpleTestCase):
+    @override_settings(XERO_CLIENT_ID='client-1', XERO_REDIRECT_URI='https://example.com/xero/callback/')
+    def test_redirects_to_xero_and_logs_only_at_debug(self):
+        with mock.patch('builtins.print') as print_, self.assertLogs('occupancy.xero_views', 'DEBUG') as logs:
+            response = Client().get('/xero/login/')
+        self.assertEqual(response.status_code, 302)
+        query = parse_qs(response['Location'].split('?', 1)[1])
+        self.assertEqual((query['client_id'], query['redirect_uri']), (['client-1'], ['https://example.com/xero/callback/']))
+        self.assertEqual(logs.records[0].levelname, 'DEBUG')
+        print_.assert_not_called()
+
+
+class XeroFixtureHandler(BaseHTTPRequestHandler):
+    """Serves Xero's token, connections and (slow) P&L report endpoints."""
+
+    report_delay = 1.0
+    report = {'Reports': [{'Rows': [
+        {'RowType': 'Header', 'Cells': [{'Value': ''}, {'Value': 'Jan 2025'}]},
+        {'RowType': 'Section', 'Rows': [
+            {'RowType': 'Row', 'Cells': [{'Value': 'Food', 'Attributes': [{'Name': 'AccountCode', 'Value': '400'}]}, {'Value': '250.00'}]},
+        ]},
+    ]}]}
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, code, body=b'', headers=()):
+        self.send_response(code)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def json(self, data):
+        self.send(200, json.dumps(data).encode(), [('Content-Type', 'application/json')])
+
+    def do_GET(self):
+        if self.path == '/connections':
+            return self.json([{'tenantId': 'tenant-1', 'tenantName': 'Papamoa Beach Ltd'}])
+        time.sleep(self.report_delay)
+        self.json(self.report)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.json({'access_token': 'access', 'refresh_token': 'refresh', 'expires_in': 1800})
+
+
+class AsyncXeroTests(TransactionTestCase):
+    """Serves childcare_admin.asgi through uvicorn against a fixture Xero."""
+
+    def setUp(self):
+        cache.clear()
+        xero_server = ThreadingHTTPServer(('127.0.0.1', 0), XeroFixtureHandler)
+        threading.Thread(target=xero_server.serve_forever, daemon=True).start()
+        self.addCleanup(xero_server.server_close)
+        self.addCleanup(xero_server.shutdown)
+        xero_url = f'http://127.0.0.1:{xero_server.server_port}'
+        for name, path in (('TOKEN_URL', '/connect/token'), ('CONNECTIONS_URL', '/connections'), ('REPORT_URL', '/Reports/ProfitAndLoss')):
+            patcher = mock.patch.object(xero, name, xero_url + path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.base_url = 'http://127.0.0.1:%d' % sock.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(application, lifespan='on', log_level='warning'))
+        thread = threading.Thread(target=self.server.run, kwargs={'sockets': [sock]}, daemon=True)
+        thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        self.addCleanup(thread.join)
+        self.addCleanup(setattr, self.server, 'should_exit', True)
+
+    def test_callback_then_actuals_do_not_block_other_requests(self):
+        Centre.objects.create(name='Papamoa Beach')
+        response = httpx.get(self.base_url + '/xero/callback/?code=abc')
+        self.assertEqual(response.text, 'Xero connected! 1 of 1 organisations linked to centres. You can now fetch actuals from the API.')
+        self.assertEqual(Centre.objects.get().xero_tenant_id, 'tenant-1')
+        self.assertFalse(xero_async._client.is_closed)  # opened by the first call, kept for the next
+
+        async def load():
+            finished = []
+
+            async def get(http, path):
+                response = await http.get(self.base_url + path)
+                finished.append(path)
+                return response
+
+            async with httpx.AsyncClient(timeout=10) as http:
+                slow = asyncio.ensure_future(get(http, '/api/xero-actuals/?from=2025-01&to=2025-01'))
+                await asyncio.sleep(0.2)  # the actuals request is now waiting on Xero
+                fast = await get(http, '/api/dashboard/?fields=overdue')
+                return finished, fast, await slow
+
+        finished, fast, slow = asyncio.run(load())
+        self.assertEqual(finished, ['/api/dashboard/?fields=overdue', '/api/xero-actuals/?from=2025-01&to=2025-01'])
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(slow.json()['actuals'], {})  # no budgets mapped to account codes yet
+        self.assertEqual(XeroActual.objects.get().amount, Decimal('250.00'))
+
+
+# A worker's startup in a fresh interpreter: its entry point (which sets up Django), then the
+# URLconf and views on the first request. Prints the modules it ended up importing.
+STARTUP = (
+    'import sys\n'
+    'from importlib import import_module\n'
+    'import_module({entry!r})\n'
+    'from django.conf import settings\n'
+    'import_module(settings.ROOT_URLCONF)\n'
+    'import occupancy.views\n'
+    'print(*sorted(sys.modules), sep="\\n")\n'
+)
+
+
+class StartupImportTests(SimpleTestCase):
+    entry_points = ['childcare_admin.wsgi', 'childcare_admin.asgi']
+    # Integrations and analysis code load on first use (childcare_admin/lazy.py, app/__init__.py, occupancy/lifespan.py)
+    lazy_modules = [
+        'numpy', 'pandas', 'httpx', 'xero_python', 'openai', 'flask', 'django.test',
+        'occupancy.xero', 'occupancy.xero_async', 'app.ai_agent_api',
+    ]
+
+    def test_integrations_are_not_imported_at_startup(self):
+        for entry in self.entry_points:
+            with self.subTest(entry=entry):
+                result = subprocess.run(
+                    [sys.executable, '-c', STARTUP.format(entry=entry)],
+                    capture_output=True, text=True, timeout=60, cwd=settings.BASE_DIR,
+                    env={**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ['DJANGO_SETTINGS_MODULE']},
+                )
+                self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+                imported = set(result.stdout.split())
+                self.assertEqual([module for module in self.lazy_modules if module in imported], [])
@@ -0,0 +1,132 @@
+"""
+Budget vs actuals variance.
+
+Effective monthly budgets (BudgetLine) are joined to the stored Xero actuals
+(XeroActual) on the centre's tenant and the budget's xero_account_code. Both are
+loaded with one query each into (rows x 12) NumPy arrays, and every figure is
+computed on whole arrays, so the cost is two queries plus a few vector operations
+however many centres, categories and years are requested.
+
+Variance is budget minus actual, so negative values are overspend.
+"""
+import numpy as np
+
+from .models import BudgetLine, XeroActual
+
+MONTHS = np.arange(12)
+
+
+def _round(values):
+    return np.round(values, 2).tolist()
+
+
+def compute_variance(years, as_of, centre_ids=None):
+    """
+    Variance for every budget in `years` (optionally only `centre_ids`), with
+    year-to-date figures up to and including `as_of` (a YYYYMM period).
+    Returns {'rows': [...], 'centres': [...], 'totals': [...]}: one entry per budget,
+    per (centre, year) and per year respectively.
+    """
+    lines = BudgetLine.objects.filter(budget__year__in=years)
+    if centre_ids:
+        lines = lines.filter(budget__centre_id__in=centre_ids)
+    lines = lines.order_by('budget__centre__name', 'budget__year', 'budget__category', 'month').values_list(
+        'budget_id', 'budget__centre_id', 'budget__centre__name', 'budget__centre__xero_tenant_id',
+        'budget__category', 'budget__xero_account_code', 'budget__year', 'month', 'amount',
+    )
+
+    rows, index = [], {}
+    row_idx, month_idx, amounts = [], [], []
+    for budget_id, centre_id, centre_name, tenant_id, category, code, year, month, amount in lines:
+        if budget_id not in index:
+            index[budget_id] = len(rows)
+            rows.append({
+                'centre_id': centre_id, 'centre_name': centre_name, 'category': category,
+                'year': year, 'account_code': code, 'tenant_id': tenant_id,
+            })
+        row_idx.append(index[budget_id])
+        month_idx.append(month - 1)
+        amounts.append(float(amount))
+    if not rows:
+        return {'rows': [], 'centres': [], 'totals': []}
+
+    budget = np.zeros((len(rows), 12))
+    budget[row_idx, month_idx] = amounts
+
+    # Several budgets can share a tenant + account code; each gets the same actuals
+    by_key = {}
+    for i, row in enumerate(rows):
+        if row['tenant_id'] and row['account_code']:
+            by_key.setdefault((row['tenant_id'], row['account_code'], row['year']), []).append(i)
+    actual = np.zeros_like(budget)
+    if by_key:
+        actuals = XeroActual.objects.filter(
+            tenant_id__in={k[0] for k in by_key}, account_code__in={k[1] for k in by_key}, year__in=years,
+        ).values_list('tenant_id', 'account_code', 'year', 'month', 'amount')
+        a_rows, a_months, a_amounts = [], [], []
+        for tenant_id, code, year, month, amount in actuals:
+            for i in by_key.get((tenant_id, code, year), ()):
+                a_rows.append(i)
+                a_months.append(month - 1)
+                a_amounts.append(float(amount))
+        np.add.at(actual, (a_rows, a_months), a_amounts)
+
+    # Months elapsed per row: all of a past year, up to as_of in its year, none for future years
+    as_of_year, as_of_month = divmod(as_of, 100)
+    year_arr = np.array([row['year'] for row in rows])
+    elapsed = np.where(year_arr < as_of_year, 12, np.where(year_arr == as_of_year, as_of_month, 0))
+    figures = _figures(budget, actual, elapsed)
+
+    for i, row in enumerate(rows):
+        del row['tenant_id']
+        row.update({name: values[i] for name, values in figures.items()})
+
+    centres = _grouped(
+        [(row['centre_id'], row['centre_name'], row['year']) for row in rows], budget, actual, elapsed,
+        ('centre_id', 'centre_name', 'year'),
+    )
+    totals = _grouped([(row['year'],) for row in rows], budget, actual, elapsed, ('year',))
+    return {'rows': rows, 'centres': centres, 'totals': totals}
+
+
+def _figures(budget, actual, elapsed):
+    """Per-row variance figures for (rows x 12) budget and actual arrays."""
+    in_ytd = MONTHS[np.newaxis, :] < elapsed[:, np.newaxis]
+    ytd_budget = (budget * in_ytd).sum(axis=1)
+    ytd_actual = (actual * in_ytd).sum(axis=1)
+    annual_budget = budget.sum(axis=1)
+    # Average monthly spend so far, projected over the rest of the year
+    burn_rate = np.divide(ytd_actual, elapsed, out=np.zeros_like(ytd_actual), where=elapsed > 0)
+    projected = ytd_actual + burn_rate * (12 - elapsed)
+    return {
+        'budget': _round(budget),
+        'actual': _round(actual),
+        'variance': _round(budget - actual),
+        'months_elapsed': elapsed.tolist(),
+        'ytd_budget': _round(ytd_budget),
+        'ytd_actual': _round(ytd_actual),
+        'ytd_variance': _round(ytd_budget - ytd_actual),
+        'annual_budget': _round(annual_budget),
+        'full_year_variance': _round(annual_budget - actual.sum(axis=1)),
+        'burn_rate': _round(burn_rate),
+        'projected': _round(projected),
+        'projected_overspend': _round(np.maximum(projected - annual_budget, 0)),
+    }
+
+
+def _grouped(keys, budget, actual, elapsed, names):
+    """Figures for the row sums of each distinct key (keys within a group share a year, so share elapsed)."""
+    groups = list(dict.fromkeys(keys))
+    position = {key: i for i, key in enumerate(groups)}
+    inverse = np.array([position[key] for key in keys])
+    group_budget = np.zeros((len(groups), 12))
+    group_actual = np.zeros((len(groups), 12))
+    group_elapsed = np.zeros(len(groups), dtype=elapsed.dtype)
+    np.add.at(group_budget, inverse, budget)
+    np.add.at(group_actual, inverse, actual)
+    group_elapsed[inverse] = elapsed
+    figures = _figures(group_budget, group_actual, group_elapsed)
+    return [
+        {**dict(zip(names, key)), **{name: values[i] for name, values in figures.items()}}
+        for i, key in enumerate(groups)
+    ]
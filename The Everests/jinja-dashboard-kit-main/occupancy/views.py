@@ -1,225 +1,313 @@
-from rest_framework.permissions import AllowAny
-
-# Store Xero tokens in memory for demo (replace with DB or session in production)
-xero_tokens = {}
-
-# API endpoint to fetch Xero P&L actuals for Jan-Dec 2025
-from rest_framework.views import APIView
-class XeroActualsView(APIView):
-    permission_classes = [AllowAny]
-    def get(self, request):
-        import requests
-        # Use stored access token (in production, use DB/session)
-        access_token = xero_tokens.get('access_token')
-        tenant_id = xero_tokens.get('tenant_id')
-        if not access_token or not tenant_id:
-            return Response({'error': 'Not authenticated with Xero'}, status=401)
-        # Fetch P&L report for Jan-Nov (periods=11)
-        url_jan_nov = "https://api.xero.com/api.xro/2.0/Reports/ProfitAndLoss?fromDate=2025-01-01&periods=11&timeframe=MONTH"
-        url_dec = "https://api.xero.com/api.xro/2.0/Reports/ProfitAndLoss?fromDate=2025-12-01&toDate=2025-12-31&timeframe=MONTH"
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'xero-tenant-id': tenant_id,
-            'Accept': 'application/json',
-        }
-        # Fetch Jan-Nov
-        resp_jan_nov = requests.get(url_jan_nov, headers=headers)
-        if resp_jan_nov.status_code != 200:
-            return Response({'error': f'Xero API error (Jan-Nov): {resp_jan_nov.text}'}, status=400)
-        data_jan_nov = resp_jan_nov.json()
-        # Fetch Dec
-        resp_dec = requests.get(url_dec, headers=headers)
-        if resp_dec.status_code != 200:
-            return Response({'error': f'Xero API error (Dec): {resp_dec.text}'}, status=400)
-        data_dec = resp_dec.json()
-
-        # DEBUG: Print raw Xero API responses and all account codes found
-        import logging
-        logger = logging.getLogger("django")
-        logger.warning("Xero Jan-Nov API response: %s", data_jan_nov)
-        logger.warning("Xero Dec API response: %s", data_dec)
-        # Parse monthly actuals by Xero account code
-        actuals_by_code = {}
-        try:
-            # Parse Jan-Nov
-            rows_jan_nov = data_jan_nov['Reports'][0]['Rows']
-            for row in rows_jan_nov:
-                if row.get('RowType') == 'Section':
-                    for subrow in row.get('Rows', []):
-                        if subrow.get('RowType') == 'Row':
-                            cells = subrow.get('Cells', [])
-                            # Xero account code is usually in the first cell's Attributes
-                            account_code = None
-                            if 'Attributes' in cells[0]:
-                                for attr in cells[0]['Attributes']:
-                                    if attr.get('Name') == 'AccountCode':
-                                        account_code = attr.get('Value')
-                            if not account_code:
-                                continue  # skip if no account code
-                            monthly = [float(c.get('Value', 0) or 0) for c in cells[1:12]]  # Jan-Nov
-                            actuals_by_code[account_code] = monthly
-            # Parse Dec and append to each account code
-            rows_dec = data_dec['Reports'][0]['Rows']
-            for row in rows_dec:
-                if row.get('RowType') == 'Section':
-                    for subrow in row.get('Rows', []):
-                        if subrow.get('RowType') == 'Row':
-                            cells = subrow.get('Cells', [])
-                            account_code = None
-                            if 'Attributes' in cells[0]:
-                                for attr in cells[0]['Attributes']:
-                                    if attr.get('Name') == 'AccountCode':
-                                        account_code = attr.get('Value')
-                            if not account_code:
-                                continue  # skip if no account code
-                            dec_value = float(cells[1].get('Value', 0) or 0) if len(cells) > 1 else 0
-                            if account_code in actuals_by_code:
-                                actuals_by_code[account_code].append(dec_value)
-                            else:
-                                actuals_by_code[account_code] = [0]*11 + [dec_value]
-        except Exception as e:
-            return Response({'error': f'Parse error: {str(e)}'}, status=500)
-
-        # Now, build a response mapping for only the budgets in the DB for this centre
-        from .models import Budget, Centre
-        centre_id = request.GET.get('centre_id')
-        if centre_id:
-            try:
-                centre = Centre.objects.get(id=centre_id)
-            except Centre.DoesNotExist:
-                return Response({'error': 'Centre not found'}, status=404)
-            budgets = Budget.objects.filter(centre=centre, year=2025)
-        else:
-            budgets = Budget.objects.filter(year=2025)
-        # Map actuals to budgets by xero_account_code
-        actuals = {}
-        for budget in budgets:
-            code = budget.xero_account_code
-            if code:
-                actuals[code] = actuals_by_code.get(code, [0]*12)
-        return Response({'actuals': actuals})
-
-
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Occupancy, Centre, Budget
-from .serializers import OccupancySerializer, BudgetSerializer
-
-# Xero OAuth2 imports
-from django.conf import settings
-from django.shortcuts import redirect
-from django.http import HttpResponse, HttpResponseBadRequest
-from xero_python.api_client import ApiClient
-from xero_python.identity import IdentityApi
-from xero_python.api_client.oauth2 import OAuth2Token
-import urllib.parse
-# Xero OAuth2: Start login
-def xero_login(request):
-    print("--- XERO LOGIN CALLED ---")
-    import urllib.parse
-    client_id = settings.XERO_CLIENT_ID
-    redirect_uri = settings.XERO_REDIRECT_URI
-    scope = "offline_access accounting.reports.read accounting.transactions.read accounting.settings.read"
-    authorize_url = (
-        "https://login.xero.com/identity/connect/authorize?response_type=code"
-        f"&client_id={urllib.parse.quote_plus(client_id)}"
-        f"&redirect_uri={urllib.parse.quote_plus(redirect_uri)}"
-        f"&scope={urllib.parse.quote_plus(scope)}"
-        f"&state=xyz"
-    )
-    print(f"XERO_CLIENT_ID: {client_id}")
-    print(f"XERO_REDIRECT_URI: {redirect_uri}")
-    print(f"Xero OAuth2 authorize_url: {authorize_url}")
-    # Write to file for Heroku debugging
-    try:
-        with open('/tmp/xero_auth_url.txt', 'w') as f:
-            f.write(f"XERO_CLIENT_ID: {client_id}\n")
-            f.write(f"XERO_REDIRECT_URI: {redirect_uri}\n")
-            f.write(f"Xero OAuth2 authorize_url: {authorize_url}\n")
-    except Exception as e:
-        print(f"Failed to write authorize_url to file: {e}")
-    return redirect(authorize_url)
-
-# Xero OAuth2: Callback
-from django.views.decorators.csrf import csrf_exempt
-import requests
-
-@csrf_exempt
-def xero_callback(request):
-    code = request.GET.get('code')
-    if not code:
-        return HttpResponseBadRequest('Missing code parameter')
-    # Exchange code for tokens
-    token_url = "https://identity.xero.com/connect/token"
-    data = {
-        'grant_type': 'authorization_code',
-        'code': code,
-        'redirect_uri': settings.XERO_REDIRECT_URI,
-        'client_id': settings.XERO_CLIENT_ID,
-        'client_secret': settings.XERO_CLIENT_SECRET,
-    }
-    resp = requests.post(token_url, data=data)
-    if resp.status_code != 200:
-        return HttpResponse(f"Token exchange failed: {resp.text}", status=400)
-    tokens = resp.json()
-    # Fetch tenant ID
-    access_token = tokens.get('access_token')
-    if not access_token:
-        return HttpResponse("No access token returned", status=400)
-    orgs_url = "https://api.xero.com/connections"
-    orgs_resp = requests.get(orgs_url, headers={"Authorization": f"Bearer {access_token}"})
-    if orgs_resp.status_code != 200:
-        return HttpResponse(f"Failed to fetch Xero tenant: {orgs_resp.text}", status=400)
-    orgs = orgs_resp.json()
-    if not orgs:
-        return HttpResponse("No Xero tenants found", status=400)
-    tenant_id = orgs[0]['tenantId']
-    # Store tokens in memory (replace with DB/session in production)
-    xero_tokens['access_token'] = access_token
-    xero_tokens['tenant_id'] = tenant_id
-    return HttpResponse("Xero connected! You can now fetch actuals from the API.")
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_date
+from .models import MONTH_FIELDS, Occupancy, OccupancyForecast, OccupancyRollup, Centre, Budget, OverdueSnapshot, XeroActual, month_year_to_period
+from .serializers import OccupancyValuesSerializer, BudgetValuesSerializer
+from .cache import cached_response, conditional
+
+# The Xero views (and requests/httpx) live in xero_views.py, loaded on their first request; see childcare_admin/urls.py
+
 
 class OccupancyByMonthView(APIView):
+    @conditional(Occupancy, Centre)
+    @cached_response('occupancy')
     def get(self, request):
         month_year = request.GET.get('month_year')
+        period_from = request.GET.get('from')
+        period_to = request.GET.get('to')
+        # Range mode: /api/occupancy/?from=01-2024&to=07-2025&centre=Papamoa Beach
+        if period_from or period_to:
+            queryset = Occupancy.objects.select_related('centre')
+            if period_from:
+                start = month_year_to_period(period_from)
+                if start is None:
+                    return Response({'error': 'from must be MM-YYYY or YYYY-MM'}, status=status.HTTP_400_BAD_REQUEST)
+                queryset = queryset.filter(period__gte=start)
+            if period_to:
+                end = month_year_to_period(period_to)
+                if end is None:
+                    return Response({'error': 'to must be MM-YYYY or YYYY-MM'}, status=status.HTTP_400_BAD_REQUEST)
+                queryset = queryset.filter(period__lte=end)
+            centre = request.GET.get('centre')
+            if centre:
+                queryset = queryset.filter(centre__name=centre)
+            queryset = queryset.order_by('period', 'centre__name')
+            serializer = OccupancyValuesSerializer(queryset, many=True)
+            return Response(serializer.data)
         if not month_year:
             return Response({'error': 'month_year parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
-        # Accept both MM-YYYY and YYYY-MM formats
-        queryset = Occupancy.objects.filter(month_year=month_year)
-        if queryset.count() == 0:
-            # Try alternate format if no results
-            if '-' in month_year:
-                parts = month_year.split('-')
-                if len(parts) == 2 and len(parts[0]) == 2 and len(parts[1]) == 4:
-                    alt_format = f"{parts[1]}-{parts[0]}"
-                    queryset = Occupancy.objects.filter(month_year=alt_format)
-        serializer = OccupancySerializer(queryset, many=True)
+        # Accept both MM-YYYY and YYYY-MM formats via the normalised period column
+        period = month_year_to_period(month_year)
+        if period is None:
+            return Response({'error': 'month_year must be MM-YYYY or YYYY-MM'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = Occupancy.objects.select_related('centre').filter(period=period)
+        serializer = OccupancyValuesSerializer(queryset, many=True)
         return Response(serializer.data)
 
 
-# New API endpoint for overdue invoices
+def _next_period(period):
+    year, month = divmod(period, 100)
+    return period + 1 if month < 12 else (year + 1) * 100 + 1
+
+
+# Whole centre x month occupancy matrix in one response, so the dashboard can
+# step through months on the client instead of calling /api/occupancy/ per month.
+class OccupancySeriesView(APIView):
+    @conditional(Occupancy, Centre)
+    @cached_response('occupancy-series')
+    def get(self, request):
+        queryset = Occupancy.objects.filter(period__isnull=False)
+        for param, lookup in (('from', 'period__gte'), ('to', 'period__lte')):
+            value = request.GET.get(param)
+            if value:
+                period = month_year_to_period(value)
+                if period is None:
+                    return Response({'error': f'{param} must be MM-YYYY or YYYY-MM'}, status=status.HTTP_400_BAD_REQUEST)
+                queryset = queryset.filter(**{lookup: period})
+        return Response(occupancy_series(queryset))
+
+
+def occupancy_series(queryset):
+    """{months, centres, u2, o2, total} matrix for an Occupancy queryset, in one query."""
+    rows = list(
+        queryset.order_by().values_list('centre_id', 'centre__name', 'period', 'u2', 'o2', 'total')
+    )
+    if not rows:
+        return {'months': [], 'centres': [], 'u2': [], 'o2': [], 'total': []}
+
+    # Contiguous month axis so gaps show up as nulls rather than being skipped
+    first, last = min(r[2] for r in rows), max(r[2] for r in rows)
+    periods = [first]
+    while periods[-1] < last:
+        periods.append(_next_period(periods[-1]))
+    month_index = {p: i for i, p in enumerate(periods)}
+
+    centres = sorted({(r[1], r[0]) for r in rows})
+    centre_index = {centre_id: i for i, (_, centre_id) in enumerate(centres)}
+    matrix = {key: [[None] * len(periods) for _ in centres] for key in ('u2', 'o2', 'total')}
+    for centre_id, _, period, u2, o2, total in rows:
+        i, j = centre_index[centre_id], month_index[period]
+        matrix['u2'][i][j] = u2
+        matrix['o2'][i][j] = o2
+        matrix['total'][i][j] = total
+
+    return {
+        'months': [f"{p // 100}-{p % 100:02d}" for p in periods],
+        'centres': [{'id': centre_id, 'name': name} for name, centre_id in centres],
+        **matrix,
+    }
+
+
+# Capacity-weighted group and region occupancy per month from the rollup table:
+# {months, scopes: [{region (null = whole group), centres, u2, o2, total, *_avg_3, *_avg_12}]}, optional from/to/region
+class OccupancyRollupView(APIView):
+    @conditional(OccupancyRollup)
+    @cached_response('occupancy-rollups')
+    def get(self, request):
+        queryset = OccupancyRollup.objects.all()
+        for param, lookup in (('from', 'period__gte'), ('to', 'period__lte')):
+            value = request.GET.get(param)
+            if value:
+                period = month_year_to_period(value)
+                if period is None:
+                    return Response({'error': f'{param} must be MM-YYYY or YYYY-MM'}, status=status.HTTP_400_BAD_REQUEST)
+                queryset = queryset.filter(**{lookup: period})
+        if 'region' in request.GET:
+            queryset = queryset.filter(region=request.GET['region'])
+        fields = ['centres', 'u2', 'o2', 'total'] + [
+            f'{field}_avg_{window}' for field in ('u2', 'o2', 'total') for window in (3, 12)
+        ]
+        rows = list(queryset.order_by('region', 'period').values_list('region', 'period', *fields))
+        periods = sorted({row[1] for row in rows})
+        month_index = {period: i for i, period in enumerate(periods)}
+        scopes = {}
+        for region, period, *values in rows:
+            scope = scopes.setdefault(region, {'region': region or None, **{f: [None] * len(periods) for f in fields}})
+            for field, value in zip(fields, values):
+                scope[field][month_index[period]] = value if field == 'centres' else float(value)
+        return Response({
+            'months': [f"{p // 100}-{p % 100:02d}" for p in periods],
+            'scopes': list(scopes.values()),
+        })
+
+
+# Stored occupancy forecasts from the forecast_occupancy job (never fitted on request):
+# {generated_at, months, centres: [{id, name, expected, lower, upper, actual, anomaly}]}, optional centre_id
+class OccupancyForecastView(APIView):
+    @conditional(OccupancyForecast)
+    @cached_response('occupancy-forecast')
+    def get(self, request):
+        queryset = OccupancyForecast.objects.all()
+        centre_id = request.GET.get('centre_id')
+        if centre_id:
+            queryset = queryset.filter(centre_id=centre_id)
+        fields = ['expected', 'lower', 'upper', 'actual', 'anomaly']
+        rows = list(queryset.order_by('centre__name', 'period').values_list('centre_id', 'centre__name', 'period', 'generated_at', *fields))
+        periods = sorted({row[2] for row in rows})
+        month_index = {period: i for i, period in enumerate(periods)}
+        centres = {}
+        for centre_id, name, period, _, *values in rows:
+            centre = centres.setdefault(centre_id, {'id': centre_id, 'name': name, **{f: [None] * len(periods) for f in fields}})
+            for field, value in zip(fields, values):
+                centre[field][month_index[period]] = float(value) if field != 'anomaly' and value is not None else value
+        return Response({
+            'generated_at': max((row[3] for row in rows), default=None),
+            'months': [f"{p // 100}-{p % 100:02d}" for p in periods],
+            'centres': list(centres.values()),
+        })
+
+
+# New API endpoint for overdue invoices: latest snapshot per centre plus the group total
 class OverdueInvoicesView(APIView):
+    @conditional(OverdueSnapshot, Centre)
+    @cached_response('overdue-invoices')
     def get(self, request):
-        data = [
+        return Response(overdue_summary())
+
+
+def overdue_summary():
+    """{centres: [...], total} from each centre's latest snapshot, in one query."""
+    rows = list(OverdueSnapshot.latest_for_centres().order_by('name').values('id', 'name', 'overdue_amount', 'overdue_recorded_at'))
+    total = sum(row['overdue_amount'] or 0 for row in rows)
+    return {
+        'centres': [
             {
-                "centre_name": c.name,
-                "overdue_invoice_amount": c.overdue_invoice_amount or "0.00"
+                'centre_id': row['id'],
+                'centre_name': row['name'],
+                'overdue_invoice_amount': f"{row['overdue_amount'] or 0:.2f}",
+                'recorded_at': row['overdue_recorded_at'],
             }
-            for c in Centre.objects.all()
-        ]
-        return Response(data)
+            for row in rows
+        ],
+        'total': f"{total:.2f}",
+    }
+
+
+# Overdue amount history per centre: ?from=2025-01-01&to=2025-06-30, optional centre_id
+class OverdueTrendView(APIView):
+    @conditional(OverdueSnapshot, Centre)
+    @cached_response('overdue-trend')
+    def get(self, request):
+        queryset = OverdueSnapshot.objects.order_by('centre__name', 'recorded_at')
+        for param, lookup in (('from', 'recorded_at__date__gte'), ('to', 'recorded_at__date__lte')):
+            value = request.GET.get(param)
+            if value:
+                day = parse_date(value)
+                if day is None:
+                    return Response({'error': f'{param} must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+                queryset = queryset.filter(**{lookup: day})
+        centre_id = request.GET.get('centre_id')
+        if centre_id:
+            queryset = queryset.filter(centre_id=centre_id)
+        series = {}
+        for centre_id, name, recorded_at, amount in queryset.values_list('centre_id', 'centre__name', 'recorded_at', 'amount'):
+            centre = series.setdefault(centre_id, {'id': centre_id, 'name': name, 'series': []})
+            centre['series'].append({'recorded_at': recorded_at, 'amount': str(amount)})
+        return Response({'centres': list(series.values())})
 
 
 # API endpoint for budgets
 class BudgetListView(APIView):
+    @conditional(Budget, Centre)
+    @cached_response('budgets')
     def get(self, request):
         centre = request.GET.get('centre')
         year = request.GET.get('year')
-        queryset = Budget.objects.all()
+        queryset = Budget.objects.select_related('centre')
         if centre:
             queryset = queryset.filter(centre__name=centre)
         if year:
             queryset = queryset.filter(year=year)
-        serializer = BudgetSerializer(queryset, many=True)
+        serializer = BudgetValuesSerializer(queryset, many=True)
         return Response(serializer.data)
+
+
+# Every centre's budgets for a year in one response:
+# {year, centres: {centre_id: {name, budgets: {category: {monthly_budget, months[12], annual, xero_account_code}}}}}
+class GroupedBudgetView(APIView):
+    @conditional(Budget, Centre)
+    @cached_response('budgets-grouped')
+    def get(self, request):
+        try:
+            year = int(request.GET.get('year') or timezone.now().year)
+        except ValueError:
+            return Response({'error': 'year must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'year': year, 'centres': grouped_budgets(year)})
+
+
+def grouped_budgets(year):
+    """{centre_id: {name, budgets: {category: ...}}} for one year, in one query."""
+    # Resolve each month's override-or-default in the database
+    effective = {f'm_{month}': Coalesce(month, 'monthly_budget') for month in MONTH_FIELDS}
+    rows = (
+        Budget.objects.filter(year=year)
+        .order_by('centre__name', 'category')
+        .values('centre_id', 'category', 'monthly_budget', 'annual_total', 'xero_account_code', centre_name=F('centre__name'), **effective)
+    )
+    centres = {}
+    for row in rows:
+        months = [row[f'm_{month}'] for month in MONTH_FIELDS]
+        centre = centres.setdefault(row['centre_id'], {'name': row['centre_name'], 'budgets': {}})
+        centre['budgets'][row['category']] = {
+            'monthly_budget': f"{row['monthly_budget']:.2f}",
+            'months': [f"{amount:.2f}" for amount in months],
+            'annual': f"{row['annual_total']:.2f}",
+            'xero_account_code': row['xero_account_code'],
+        }
+    return centres
+
+
+# Budget vs Xero actuals, computed server-side (see occupancy/variance.py):
+# ?year=2025 (repeatable, default current year), optional centre_id (repeatable), as_of=2025-06 (default this month)
+class BudgetVarianceView(APIView):
+    @conditional(Budget, XeroActual, Centre)
+    @cached_response('budget-variance')
+    def get(self, request):
+        try:
+            years = sorted({int(year) for year in request.GET.getlist('year')}) or [timezone.now().year]
+            centre_ids = [int(centre_id) for centre_id in request.GET.getlist('centre_id')]
+        except ValueError:
+            return Response({'error': 'year and centre_id must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        now = timezone.now()
+        as_of = month_year_to_period(request.GET.get('as_of')) if request.GET.get('as_of') else now.year * 100 + now.month
+        if as_of is None:
+            return Response({'error': 'as_of must be MM-YYYY or YYYY-MM'}, status=status.HTTP_400_BAD_REQUEST)
+        # variance.py brings in NumPy, so it is imported on the first variance request rather than at startup
+        from .variance import compute_variance
+        result = compute_variance(years, as_of, centre_ids)
+        return Response({'years': years, 'as_of': f"{as_of // 100}-{as_of % 100:02d}", **result})
+
+
+# Everything index.html renders on load in one request, one query per section:
+# {occupancy: <series>, overdue: <overdue-invoices>, budgets: {year, centres: <grouped>}}
+# ?fields=occupancy,overdue (default all sections), year for the budgets section
+DASHBOARD_SECTIONS = ('occupancy', 'overdue', 'budgets')
+
+
+class DashboardView(APIView):
+    @conditional(Occupancy, OverdueSnapshot, Budget, Centre)
+    @cached_response('dashboard')
+    def get(self, request):
+        fields = [f for value in request.GET.getlist('fields') for f in value.split(',') if f] or DASHBOARD_SECTIONS
+        unknown = set(fields) - set(DASHBOARD_SECTIONS)
+        if unknown:
+            return Response(
+                {'error': f"fields must be from {', '.join(DASHBOARD_SECTIONS)}; got {', '.join(sorted(unknown))}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            year = int(request.GET.get('year') or timezone.now().year)
+        except ValueError:
+            return Response({'error': 'year must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        data = {}
+        if 'occupancy' in fields:
+            data['occupancy'] = occupancy_series(Occupancy.objects.filter(period__isnull=False))
+        if 'overdue' in fields:
+            data['overdue'] = overdue_summary()
+        if 'budgets' in fields:
+            data['budgets'] = {'year': year, 'centres': grouped_budgets(year)}
+        return Response(data)
@@ -0,0 +1,396 @@
+"""
+Xero integration: OAuth2 token storage and the P&L actuals snapshot.
+
+Tokens live in the XeroToken table (cache-fronted) and are refreshed shortly
+before expiry under a row lock, so only one worker calls Xero per refresh.
+P&L actuals for every connected tenant (one per centre) are fetched
+concurrently by the sync_xero_actuals command (or a background refresh) into
+XeroActual, and the API serves from that table. xero_async.py has the
+non-blocking equivalents used by the views when served over ASGI.
+"""
+import calendar
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from decimal import Decimal
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from . import cache as api_cache
+from .models import Centre, XeroActual, XeroToken
+
+logger = logging.getLogger(__name__)
+
+TOKEN_URL = "https://identity.xero.com/connect/token"
+REPORT_URL = "https://api.xero.com/api.xro/2.0/Reports/ProfitAndLoss"
+CONNECTIONS_URL = "https://api.xero.com/connections"
+TOKEN_CACHE_KEY = 'xero:token'
+# Refresh this long before the access token actually expires
+REFRESH_MARGIN = timedelta(minutes=2)
+# 429 handling: retries per request and the longest Retry-After we will wait
+MAX_RETRIES = 3
+MAX_RETRY_AFTER = 60
+# A P&L report covers the requested month plus at most 11 comparison periods
+MONTHS_PER_REPORT = 12
+# Column headings Xero uses for monthly P&L reports, e.g. "31 Dec 25" or "Dec 2025"
+HEADER_DATE_FORMATS = ('%d %b %y', '%d %b %Y', '%b %y', '%b %Y', '%b-%y', '%b-%Y')
+
+
+class XeroAuthError(Exception):
+    """Raised when no usable Xero token is available and the user must reconnect."""
+
+
+class XeroAPIError(Exception):
+    """Raised when a Xero report request fails or returns something we can't parse."""
+
+
+def _cache_token(token):
+    data = {
+        'access_token': token.access_token,
+        'tenant_id': token.tenant_id,
+        'expires_at': token.expires_at,
+    }
+    timeout = (token.expires_at - REFRESH_MARGIN - timezone.now()).total_seconds()
+    if timeout > 0:
+        cache.set(TOKEN_CACHE_KEY, data, timeout)
+    return data
+
+
+def _needs_refresh(expires_at):
+    return expires_at - REFRESH_MARGIN <= timezone.now()
+
+
+def store_tokens(tokens, tenant_id):
+    """Save the token response from the authorization_code exchange."""
+    token = XeroToken.objects.order_by('pk').first() or XeroToken()
+    token.access_token = tokens['access_token']
+    token.refresh_token = tokens.get('refresh_token')
+    token.expires_at = timezone.now() + timedelta(seconds=int(tokens.get('expires_in', 1800)))
+    token.tenant_id = tenant_id
+    token.save()
+    _cache_token(token)
+    return token
+
+
+def _refresh():
+    with transaction.atomic():
+        token = XeroToken.objects.select_for_update().order_by('pk').first()
+        if token is None:
+            raise XeroAuthError('Not authenticated with Xero')
+        # Another worker may have refreshed while we waited for the lock
+        if not _needs_refresh(token.expires_at):
+            return _cache_token(token)
+        if not token.refresh_token:
+            raise XeroAuthError('Xero access token expired and no refresh token is stored')
+        resp = requests.post(TOKEN_URL, data={
+            'grant_type': 'refresh_token',
+            'refresh_token': token.refresh_token,
+            'client_id': settings.XERO_CLIENT_ID,
+            'client_secret': settings.XERO_CLIENT_SECRET,
+        }, timeout=30)
+        if resp.status_code != 200:
+            logger.error("Xero token refresh failed: %s %s", resp.status_code, resp.text)
+            raise XeroAuthError('Xero token refresh failed, please reconnect')
+        tokens = resp.json()
+        token.access_token = tokens['access_token']
+        # Xero rotates refresh tokens; keep the old one only if none was returned
+        token.refresh_token = tokens.get('refresh_token', token.refresh_token)
+        token.expires_at = timezone.now() + timedelta(seconds=int(tokens.get('expires_in', 1800)))
+        token.save()
+    return _cache_token(token)
+
+
+def get_token():
+    """Return {'access_token', 'tenant_id', 'expires_at'}, refreshing if close to expiry.
+
+    Raises XeroAuthError if Xero has never been connected or the refresh fails.
+    """
+    data = cache.get(TOKEN_CACHE_KEY)
+    if data and not _needs_refresh(data['expires_at']):
+        return data
+    token = XeroToken.objects.order_by('pk').first()
+    if token is None:
+        raise XeroAuthError('Not authenticated with Xero')
+    if _needs_refresh(token.expires_at):
+        return _refresh()
+    return _cache_token(token)
+
+
+def month_periods(start, end):
+    """Every YYYYMM period from start to end inclusive."""
+    periods = []
+    period = start
+    while period <= end:
+        periods.append(period)
+        year, month = divmod(period, 100)
+        period = period + 1 if month < 12 else (year + 1) * 100 + 1
+    return periods
+
+
+def report_requests(periods):
+    """Query params for the fewest P&L calls covering `periods`.
+
+    One report returns the requested month plus up to 11 comparison months, so
+    each call covers 12 consecutive months, anchored on the last month of the chunk.
+    """
+    params = []
+    for i in range(0, len(periods), MONTHS_PER_REPORT):
+        chunk = periods[i:i + MONTHS_PER_REPORT]
+        year, month = divmod(chunk[-1], 100)
+        last_day = calendar.monthrange(year, month)[1]
+        query = {
+            'fromDate': f'{year}-{month:02d}-01',
+            'toDate': f'{year}-{month:02d}-{last_day}',
+            'timeframe': 'MONTH',
+        }
+        if len(chunk) > 1:
+            query['periods'] = len(chunk) - 1
+        params.append((chunk, query))
+    return params
+
+
+def _header_period(value):
+    for fmt in HEADER_DATE_FORMATS:
+        try:
+            date = datetime.strptime(value.strip(), fmt)
+        except (AttributeError, ValueError):
+            continue
+        return date.year * 100 + date.month
+    return None
+
+
+def _account_code(cells):
+    # Xero account code is usually in the first cell's Attributes
+    for attr in cells[0].get('Attributes', []) if cells else []:
+        if attr.get('Name') == 'AccountCode':
+            return attr.get('Value')
+    return None
+
+
+def parse_profit_and_loss(data, chunk, index, actuals_by_code):
+    """Walk one report's Rows/Cells tree once, adding values into `actuals_by_code`.
+
+    `chunk` is the list of periods the report covers and `index` maps each period to
+    its position in the per-account arrays. Column periods come from the Header row;
+    columns whose heading can't be read are assumed newest-first, as Xero returns them.
+    """
+    columns = list(reversed(chunk))
+    size = len(index)
+    try:
+        stack = list(reversed(data['Reports'][0]['Rows']))
+        while stack:
+            row = stack.pop()
+            row_type = row.get('RowType')
+            if row_type == 'Header':
+                headings = [_header_period(c.get('Value')) for c in row.get('Cells', [])[1:]]
+                columns = [heading or fallback for heading, fallback in zip(headings, reversed(chunk))]
+            elif row_type == 'Section':
+                stack.extend(reversed(row.get('Rows', [])))
+            elif row_type == 'Row':
+                cells = row.get('Cells', [])
+                account_code = _account_code(cells)
+                if not account_code:
+                    continue  # skip if no account code
+                values = actuals_by_code.get(account_code)
+                if values is None:
+                    values = actuals_by_code[account_code] = [0.0] * size
+                for period, cell in zip(columns, cells[1:]):
+                    position = index.get(period)
+                    if position is not None:
+                        values[position] += float(cell.get('Value') or 0)
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise XeroAPIError(f'Parse error: {e}') from e
+    return actuals_by_code
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Shared, connection-pooled HTTP session for Xero API calls."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.XERO_MAX_CONCURRENCY)
+            session.mount('https://', adapter)
+            _session = session
+    return _session
+
+
+def report_headers(tenant_id, access_token):
+    return {
+        'Authorization': f"Bearer {access_token}",
+        'xero-tenant-id': tenant_id,
+        'Accept': 'application/json',
+    }
+
+
+def retry_delay(resp):
+    """Seconds to wait before retrying a 429 response."""
+    return min(float(resp.headers.get('Retry-After', 1) or 1), MAX_RETRY_AFTER)
+
+
+def _get(url, params, headers):
+    # Honour Xero's 429 Retry-After (per-tenant minute/concurrency limits) before giving up
+    for attempt in range(MAX_RETRIES + 1):
+        resp = get_session().get(url, params=params, headers=headers, timeout=60)
+        if resp.status_code != 429 or attempt == MAX_RETRIES:
+            return resp
+        delay = retry_delay(resp)
+        logger.warning("Xero rate limit hit for tenant %s, retrying in %ss", headers.get('xero-tenant-id'), delay)
+        time.sleep(delay)
+    return resp
+
+
+def fetch_profit_and_loss(periods, tenant_id, access_token):
+    """Fetch P&L actuals for consecutive `periods` for one tenant.
+
+    Returns {account_code: [float per period]}, using ceil(len(periods) / 12) report calls.
+    """
+    headers = report_headers(tenant_id, access_token)
+    index = {period: i for i, period in enumerate(periods)}
+    actuals_by_code = {}
+    for chunk, params in report_requests(periods):
+        resp = _get(REPORT_URL, params, headers)
+        if resp.status_code != 200:
+            raise XeroAPIError(f"Xero API error ({params['toDate']}): {resp.text}")
+        parse_profit_and_loss(resp.json(), chunk, index, actuals_by_code)
+    logger.info("Fetched Xero P&L %s-%s (tenant %s): %d accounts", periods[0], periods[-1], tenant_id, len(actuals_by_code))
+    return actuals_by_code
+
+
+def link_tenants(connections):
+    """Map the tenants returned by /connections onto Centre rows by organisation name."""
+    linked = 0
+    centres = list(Centre.objects.all())
+    for org in connections:
+        tenant_name = (org.get('tenantName') or '').lower()
+        for centre in centres:
+            if centre.name.lower() in tenant_name:
+                if centre.xero_tenant_id != org['tenantId']:
+                    Centre.objects.filter(xero_tenant_id=org['tenantId']).exclude(pk=centre.pk).update(xero_tenant_id=None, updated_at=timezone.now())
+                    centre.xero_tenant_id = org['tenantId']
+                    centre.save(update_fields=['xero_tenant_id', 'updated_at'])
+                linked += 1
+                break
+        else:
+            logger.warning("Xero tenant %r (%s) does not match any centre", org.get('tenantName'), org['tenantId'])
+    return linked
+
+
+def tenant_ids():
+    """Tenants to fetch: every centre linked to Xero, else the tenant stored with the token."""
+    ids = list(Centre.objects.exclude(xero_tenant_id__isnull=True).exclude(xero_tenant_id='')
+               .values_list('xero_tenant_id', flat=True))
+    if not ids:
+        default = get_token()['tenant_id']
+        ids = [default] if default else []
+    return ids
+
+
+def fetch_all_tenants(periods):
+    """Fetch every tenant's P&L concurrently. Returns ({tenant_id: actuals_by_code}, {tenant_id: error})."""
+    access_token = get_token()['access_token']
+    ids = tenant_ids()
+    if not ids:
+        raise XeroAuthError('Not authenticated with Xero')
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=min(len(ids), settings.XERO_MAX_CONCURRENCY)) as pool:
+        futures = {pool.submit(fetch_profit_and_loss, periods, tenant_id, access_token): tenant_id for tenant_id in ids}
+        for future in as_completed(futures):
+            tenant_id = futures[future]
+            try:
+                results[tenant_id] = future.result()
+            except (XeroAPIError, requests.RequestException) as e:
+                logger.error("Xero P&L fetch for tenant %s failed: %s", tenant_id, e)
+                errors[tenant_id] = str(e)
+    return results, errors
+
+
+def _in_window(queryset, start, end):
+    return queryset.annotate(period=F('year') * 100 + F('month')).filter(period__gte=start, period__lte=end)
+
+
+def sync_actuals(start, end):
+    """Fetch every tenant's P&L for periods start..end (YYYYMM) and replace their stored snapshots.
+
+    Returns the number of rows stored.
+    """
+    periods = month_periods(start, end)
+    results, errors = fetch_all_tenants(periods)
+    return store_actuals(start, end, periods, results, errors)
+
+
+def store_actuals(start, end, periods, results, errors):
+    """Replace the stored snapshots of the tenants in `results` for start..end. Returns the number of rows stored."""
+    if not results:
+        raise XeroAPIError('; '.join(errors.values()) or 'No Xero data returned')
+    fetched_at = timezone.now()
+    rows = [
+        XeroActual(
+            tenant_id=tenant_id, account_code=code, year=period // 100, month=period % 100,
+            amount=Decimal(str(amount)).quantize(Decimal('0.01')), fetched_at=fetched_at,
+        )
+        for tenant_id, actuals_by_code in results.items()
+        for code, values in actuals_by_code.items()
+        for period, amount in zip(periods, values)
+    ]
+    with transaction.atomic():
+        stale = _in_window(XeroActual.objects.filter(tenant_id__in=list(results)), start, end)
+        XeroActual.objects.filter(pk__in=stale.values('pk')).delete()
+        XeroActual.objects.bulk_create(rows, batch_size=500)
+    # New snapshot: drop cached API versions so the actuals ETag changes
+    api_cache.invalidate()
+    return len(rows)
+
+
+def snapshot_fetched_at(start, end):
+    """Return when the stored snapshot for start..end was fetched, or None if there isn't one."""
+    queryset = _in_window(XeroActual.objects.all(), start, end)
+    return queryset.aggregate(latest=Max('fetched_at'))['latest']
+
+
+def get_actuals(start, end, account_codes=None, tenant_id=None):
+    """Return {account_code: [float per month from start to end]} from the stored snapshot.
+
+    Without a tenant_id, amounts are summed across all tenants (group totals).
+    """
+    index = {period: i for i, period in enumerate(month_periods(start, end))}
+    queryset = _in_window(XeroActual.objects.all(), start, end)
+    if tenant_id is not None:
+        queryset = queryset.filter(tenant_id=tenant_id)
+    if account_codes is not None:
+        queryset = queryset.filter(account_code__in=account_codes)
+    actuals = {}
+    for code, period, amount in queryset.values_list('account_code', 'period', 'amount'):
+        actuals.setdefault(code, [0.0] * len(index))[index[period]] += float(amount)
+    return actuals
+
+
+def _background_sync(start, end):
+    try:
+        sync_actuals(start, end)
+    except (XeroAuthError, XeroAPIError, requests.RequestException):
+        logger.exception("Background Xero actuals refresh for %s-%s failed", start, end)
+    finally:
+        cache.delete(f'xero:actuals:refreshing:{start}-{end}')
+        connection.close()
+
+
+def refresh_actuals_in_background(start, end):
+    """Start a background refresh unless one is already running. Returns True if started."""
+    # cache.add is atomic, so concurrent stale requests only start one refresh
+    if not cache.add(f'xero:actuals:refreshing:{start}-{end}', True, timeout=300):
+        return False
+    threading.Thread(target=_background_sync, args=(start, end), daemon=True).start()
+    return True
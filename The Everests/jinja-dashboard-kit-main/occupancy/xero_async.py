@@ -0,0 +1,142 @@
+"""
+Non-blocking Xero calls for the views, using one shared httpx.AsyncClient.
+
+Served through uvicorn (childcare_admin.asgi), the shared client is opened by
+the first Xero call after ASGI lifespan startup and closed on shutdown (see
+lifespan.py), so every later request in the worker reuses its connection pool,
+and a view waiting on Xero frees the event loop for other requests instead of
+holding a whole worker. Without a lifespan (runserver, gunicorn's WSGI workers)
+each call opens and closes its own client.
+
+Token storage, report parsing and the XeroActual snapshot are shared with xero.py;
+only the HTTP calls differ.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+import httpx
+
+from . import lifespan, xero
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = 60
+
+_client = None
+
+
+def _new_client():
+    limits = httpx.Limits(max_connections=settings.XERO_MAX_CONCURRENCY * 2, max_keepalive_connections=settings.XERO_MAX_CONCURRENCY)
+    return httpx.AsyncClient(limits=limits, timeout=TIMEOUT)
+
+
+async def open_client():
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _new_client()
+    return _client
+
+
+async def close_client():
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+lifespan.on_shutdown(close_client)
+
+
+@asynccontextmanager
+async def client():
+    """The worker's shared client under an ASGI lifespan (opened on first use), otherwise a client for this block."""
+    if lifespan.running:
+        yield await open_client()
+    else:
+        async with _new_client() as own:
+            yield own
+
+
+async def exchange_code(code):
+    """Swap an authorization code for tokens. Raises XeroAuthError if Xero refuses it."""
+    async with client() as http:
+        resp = await http.post(xero.TOKEN_URL, data={
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': settings.XERO_REDIRECT_URI,
+            'client_id': settings.XERO_CLIENT_ID,
+            'client_secret': settings.XERO_CLIENT_SECRET,
+        })
+    if resp.status_code != 200:
+        raise xero.XeroAuthError(f"Token exchange failed: {resp.text}")
+    return resp.json()
+
+
+async def connections(access_token):
+    """Organisations the token can access (GET /connections)."""
+    async with client() as http:
+        resp = await http.get(xero.CONNECTIONS_URL, headers={'Authorization': f"Bearer {access_token}"})
+    if resp.status_code != 200:
+        raise xero.XeroAPIError(f"Failed to fetch Xero tenant: {resp.text}")
+    return resp.json()
+
+
+async def _get(http, url, params, headers):
+    for attempt in range(xero.MAX_RETRIES + 1):
+        resp = await http.get(url, params=params, headers=headers)
+        if resp.status_code != 429 or attempt == xero.MAX_RETRIES:
+            return resp
+        delay = xero.retry_delay(resp)
+        logger.warning("Xero rate limit hit for tenant %s, retrying in %ss", headers.get('xero-tenant-id'), delay)
+        await asyncio.sleep(delay)
+    return resp
+
+
+async def fetch_profit_and_loss(http, periods, tenant_id, access_token):
+    """Async xero.fetch_profit_and_loss: {account_code: [float per period]} for one tenant."""
+    headers = xero.report_headers(tenant_id, access_token)
+    index = {period: i for i, period in enumerate(periods)}
+    actuals_by_code = {}
+    for chunk, params in xero.report_requests(periods):
+        resp = await _get(http, xero.REPORT_URL, params, headers)
+        if resp.status_code != 200:
+            raise xero.XeroAPIError(f"Xero API error ({params['toDate']}): {resp.text}")
+        xero.parse_profit_and_loss(resp.json(), chunk, index, actuals_by_code)
+    logger.info("Fetched Xero P&L %s-%s (tenant %s): %d accounts", periods[0], periods[-1], tenant_id, len(actuals_by_code))
+    return actuals_by_code
+
+
+async def fetch_all_tenants(periods):
+    """Async xero.fetch_all_tenants: every tenant at once, at most XERO_MAX_CONCURRENCY in flight."""
+    access_token = (await sync_to_async(xero.get_token)())['access_token']
+    ids = await sync_to_async(xero.tenant_ids)()
+    if not ids:
+        raise xero.XeroAuthError('Not authenticated with Xero')
+    limit = asyncio.Semaphore(settings.XERO_MAX_CONCURRENCY)
+
+    async def fetch(http, tenant_id):
+        async with limit:
+            return await fetch_profit_and_loss(http, periods, tenant_id, access_token)
+
+    async with client() as http:
+        outcomes = await asyncio.gather(*(fetch(http, tenant_id) for tenant_id in ids), return_exceptions=True)
+    results, errors = {}, {}
+    for tenant_id, outcome in zip(ids, outcomes):
+        if isinstance(outcome, (xero.XeroAPIError, httpx.HTTPError)):
+            logger.error("Xero P&L fetch for tenant %s failed: %s", tenant_id, outcome)
+            errors[tenant_id] = str(outcome)
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            results[tenant_id] = outcome
+    return results, errors
+
+
+async def sync_actuals(start, end):
+    """Async xero.sync_actuals: fetch every tenant's P&L for start..end and replace their snapshots."""
+    periods = xero.month_periods(start, end)
+    results, errors = await fetch_all_tenants(periods)
+    return await sync_to_async(xero.store_actuals)(start, end, periods, results, errors)
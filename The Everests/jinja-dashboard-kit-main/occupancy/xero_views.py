@@ -0,0 +1,173 @@
+"""
+Xero views: the P&L actuals API and the OAuth2 login/callback.
+
+Kept apart from views.py so that requests, httpx and the Xero client modules are
+only imported when a Xero URL is first requested (childcare_admin/urls.py routes
+here through lazy_view), not by every worker at startup.
+"""
+import logging
+import urllib.parse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.shortcuts import redirect
+from django.utils import timezone
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+import httpx
+import requests
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import xero, xero_async
+from .cache import conditional
+from .models import Budget, Centre, XeroActual, month_year_to_period
+
+logger = logging.getLogger(__name__)
+
+
+# API endpoint serving Xero P&L actuals from the stored snapshot.
+# ?year=2025 (default: current year) or ?from=2024-01&to=2025-12, optional centre_id
+class XeroActualsView(APIView):
+    permission_classes = [AllowAny]
+    # Longest window served in one request (five years)
+    max_months = 60
+
+    @classmethod
+    def window(cls, request):
+        """(start, end, periods) requested; raises ValueError with the message for a 400."""
+        try:
+            year = int(request.GET.get('year') or timezone.now().year)
+        except ValueError:
+            raise ValueError('year must be a number')
+        start, end = year * 100 + 1, year * 100 + 12
+        for param in ('from', 'to'):
+            value = request.GET.get(param)
+            if value:
+                period = month_year_to_period(value)
+                if period is None:
+                    raise ValueError(f'{param} must be MM-YYYY or YYYY-MM')
+                if param == 'from':
+                    start = period
+                else:
+                    end = period
+        periods = xero.month_periods(start, end)
+        if not periods or len(periods) > cls.max_months:
+            raise ValueError(f'from/to must span 1 to {cls.max_months} months')
+        return start, end, periods
+
+    def get(self, request):
+        try:
+            start, end, periods = self.window(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+        fetched_at = xero.snapshot_fetched_at(start, end)
+        if fetched_at is None:
+            # No snapshot yet: fetch once inline so the first page load has data
+            try:
+                xero.sync_actuals(start, end)
+            except xero.XeroAuthError as e:
+                return Response({'error': str(e)}, status=401)
+            except (xero.XeroAPIError, requests.RequestException) as e:
+                return Response({'error': str(e)}, status=400)
+            fetched_at = xero.snapshot_fetched_at(start, end)
+        elif (timezone.now() - fetched_at).total_seconds() > settings.XERO_ACTUALS_MAX_AGE:
+            # Serve the stale snapshot now and refresh it for the next request
+            xero.refresh_actuals_in_background(start, end)
+        return self.actuals(request, start, end, periods, fetched_at)
+
+    # Validators are checked after the snapshot is (re)fetched, so a stale one still gets refreshed
+    @conditional(XeroActual, Budget, Centre)
+    def actuals(self, request, start, end, periods, fetched_at):
+        # Now, build a response mapping for only the budgets in the DB for this centre
+        centre_id = request.GET.get('centre_id')
+        if centre_id:
+            try:
+                centre = Centre.objects.get(id=centre_id)
+            except Centre.DoesNotExist:
+                return Response({'error': 'Centre not found'}, status=404)
+            if not centre.xero_tenant_id:
+                # Without a tenant the filter below would fall back to every tenant's totals
+                return Response({'error': f'{centre.name} is not linked to a Xero organisation'}, status=409)
+            budgets = Budget.objects.filter(centre=centre)
+            tenant_id = centre.xero_tenant_id
+        else:
+            budgets = Budget.objects.all()
+            tenant_id = None  # group totals across every tenant
+        budgets = budgets.filter(year__in={period // 100 for period in periods})
+        # Map actuals to budgets by xero_account_code
+        codes = {code for code in budgets.values_list('xero_account_code', flat=True) if code}
+        actuals_by_code = xero.get_actuals(start, end, codes, tenant_id=tenant_id)
+        actuals = {code: actuals_by_code.get(code, [0] * len(periods)) for code in codes}
+        return Response({
+            'months': [f"{period // 100}-{period % 100:02d}" for period in periods],
+            'actuals': actuals,
+            'fetched_at': fetched_at,
+        })
+
+
+# Routed at /api/xero-actuals/. The first request for a window awaits Xero on the shared
+# async client (xero_async.py) instead of blocking a worker; the stored snapshot, stale
+# refreshes and validators are then handled by XeroActualsView as before.
+class AsyncXeroActualsView(View):
+    async def get(self, request):
+        try:
+            start, end, periods = XeroActualsView.window(request)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        if await sync_to_async(xero.snapshot_fetched_at)(start, end) is None:
+            try:
+                await xero_async.sync_actuals(start, end)
+            except xero.XeroAuthError as e:
+                return JsonResponse({'error': str(e)}, status=401)
+            except (xero.XeroAPIError, httpx.HTTPError) as e:
+                return JsonResponse({'error': str(e)}, status=400)
+        return await sync_to_async(XeroActualsView.as_view())(request)
+
+
+# Xero OAuth2: Start login
+def xero_login(request):
+    client_id = settings.XERO_CLIENT_ID
+    redirect_uri = settings.XERO_REDIRECT_URI
+    scope = "offline_access accounting.reports.read accounting.transactions.read accounting.settings.read"
+    authorize_url = (
+        "https://login.xero.com/identity/connect/authorize?response_type=code"
+        f"&client_id={urllib.parse.quote_plus(client_id)}"
+        f"&redirect_uri={urllib.parse.quote_plus(redirect_uri)}"
+        f"&scope={urllib.parse.quote_plus(scope)}"
+        f"&state=xyz"
+    )
+    logger.debug("Redirecting to Xero login: %s", authorize_url)
+    return redirect(authorize_url)
+
+
+# Xero OAuth2: Callback
+@csrf_exempt
+async def xero_callback(request):
+    code = request.GET.get('code')
+    if not code:
+        return HttpResponseBadRequest('Missing code parameter')
+    # Exchange code for tokens (async, so waiting on Xero doesn't hold a worker)
+    try:
+        tokens = await xero_async.exchange_code(code)
+    except xero.XeroAuthError as e:
+        return HttpResponse(str(e), status=400)
+    # Fetch tenant ID
+    access_token = tokens.get('access_token')
+    if not access_token:
+        return HttpResponse("No access token returned", status=400)
+    try:
+        orgs = await xero_async.connections(access_token)
+    except xero.XeroAPIError as e:
+        return HttpResponse(str(e), status=400)
+    if not orgs:
+        return HttpResponse("No Xero tenants found", status=400)
+    tenant_id = orgs[0]['tenantId']
+    # Persist access + refresh tokens so every worker can use (and refresh) them
+    await sync_to_async(xero.store_tokens)(tokens, tenant_id)
+    # One token covers every authorised organisation; link each to its centre
+    linked = await sync_to_async(xero.link_tenants)(orgs)
+    return HttpResponse(f"Xero connected! {linked} of {len(orgs)} organisations linked to centres. You can now fetch actuals from the API.")
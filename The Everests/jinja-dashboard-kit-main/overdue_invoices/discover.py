@@ -0,0 +1,221 @@
+"""
+Discover Childcare dashboard scraping.
+
+The default path logs in with a pooled requests session and reads each centre's
+overdue invoices amount straight from the dashboard HTML with lxml. Centres it
+can't read fall back to the browser path: one Chrome logs in, then its cookies
+are copied into a small pool of browsers that read dashboards concurrently,
+using explicit element waits instead of fixed sleeps.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import queue
+from urllib.parse import urljoin
+
+from lxml import html
+import requests
+from requests.adapters import HTTPAdapter
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+BASE_URL = 'https://discoverchildcare.co.nz'
+LOGIN_URL = f'{BASE_URL}/Account/Login'
+DASHBOARD_URL = BASE_URL + '/{api_id}/Home'
+AMOUNT_XPATH = "//h5[contains(text(), 'Overdue invoices amount')]/../../..//h1[@class='no-margins']"
+# Seconds to wait for the login form, the post-login redirect and each dashboard widget
+WAIT_TIMEOUT = 20
+
+
+class DiscoverError(Exception):
+    """Raised when Discover login fails, credentials are missing or a dashboard can't be read."""
+
+
+def credentials():
+    email = os.environ.get('DISCOVER_EMAIL')
+    password = os.environ.get('DISCOVER_PASSWORD')
+    if not email or not password:
+        raise DiscoverError('Please set DISCOVER_EMAIL and DISCOVER_PASSWORD environment variables.')
+    return email, password
+
+
+def new_driver(headless=False):
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    return webdriver.Chrome(options=chrome_options)
+
+
+def login(driver, email, password, timeout=WAIT_TIMEOUT):
+    """Log in and return the session cookies; every failure is a DiscoverError."""
+    wait = WebDriverWait(driver, timeout)
+    try:
+        driver.get(LOGIN_URL)
+        wait.until(EC.presence_of_element_located((By.ID, 'Email'))).send_keys(email)
+        driver.find_element(By.ID, 'Password').send_keys(password)
+        driver.find_element(By.XPATH, "//button[@type='submit']").click()
+    except WebDriverException as e:  # TimeoutException included
+        raise DiscoverError(f'Discover login page did not load: {e.msg or type(e).__name__}') from e
+    try:
+        wait.until(lambda d: '/Account/Login' not in d.current_url)
+        return driver.get_cookies()
+    except TimeoutException:
+        raise DiscoverError('Discover login failed: still on the login page')
+    except WebDriverException as e:
+        raise DiscoverError(f'Discover login failed: {e.msg or type(e).__name__}') from e
+
+
+def share_session(driver, cookies):
+    # Cookies can only be set for the domain currently loaded
+    driver.get(BASE_URL)
+    for cookie in cookies:
+        driver.add_cookie({k: v for k, v in cookie.items() if k in ('name', 'value', 'path', 'secure', 'httpOnly', 'expiry')})
+
+
+def read_overdue_amount(driver, api_id, timeout=WAIT_TIMEOUT):
+    driver.get(DASHBOARD_URL.format(api_id=api_id))
+    # The dashboard widgets render lazily as the page scrolls
+    driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
+    amount = WebDriverWait(driver, timeout).until(EC.visibility_of_element_located((By.XPATH, AMOUNT_XPATH)))
+    return amount.text
+
+
+def scrape_overdue_amounts(centres, concurrency=4, headless=False, timeout=WAIT_TIMEOUT):
+    """
+    Return {centre: amount text or exception} for each centre.
+    One browser logs in; up to `concurrency` browsers (including it) share its session.
+    """
+    centres = [centre for centre in centres if centre.api_id]
+    if not centres:
+        return {}
+    email, password = credentials()
+    pending = queue.Queue()
+    for centre in centres:
+        pending.put(centre)
+    results = {}
+
+    try:
+        first = new_driver(headless)
+    except WebDriverException as e:
+        raise DiscoverError(f'Could not start Chrome: {e.msg or type(e).__name__}') from e
+    try:
+        cookies = login(first, email, password, timeout)
+    except Exception:
+        first.quit()
+        raise
+
+    def worker(driver):
+        try:
+            if driver is not first:
+                share_session(driver, cookies)
+            while True:
+                try:
+                    centre = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[centre] = read_overdue_amount(driver, centre.api_id, timeout)
+                except (TimeoutException, WebDriverException) as e:
+                    results[centre] = e
+        finally:
+            driver.quit()
+
+    size = max(1, min(concurrency, len(centres)))
+    with ThreadPoolExecutor(max_workers=size) as pool:
+        futures = [pool.submit(worker, first)]
+        for _ in range(size - 1):
+            try:
+                futures.append(pool.submit(worker, new_driver(headless)))
+            except WebDriverException:
+                break  # run with the browsers we could start
+        for future in futures:
+            future.result()
+    return results
+
+
+def http_session(pool_size=4):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def http_login(session, email, password, base_url=BASE_URL, timeout=WAIT_TIMEOUT):
+    login_url = base_url + '/Account/Login'
+    page = session.get(login_url, timeout=timeout)
+    page.raise_for_status()
+    forms = [f for f in html.fromstring(page.content).forms if f.xpath(".//input[@id='Email']")]
+    if not forms:
+        raise DiscoverError('Discover login form not found')
+    form = forms[0]
+    # Keep the hidden fields, including __RequestVerificationToken
+    data = dict(form.form_values())
+    data[form.xpath(".//input[@id='Email']")[0].get('name', 'Email')] = email
+    data[form.xpath(".//input[@id='Password']")[0].get('name', 'Password')] = password
+    response = session.post(urljoin(page.url, form.get('action') or login_url), data=data, timeout=timeout)
+    response.raise_for_status()
+    if '/Account/Login' in response.url:
+        raise DiscoverError('Discover login failed: still on the login page')
+
+
+def parse_overdue_amount(content):
+    found = html.fromstring(content).xpath(AMOUNT_XPATH)
+    if not found:
+        raise DiscoverError('Overdue invoices amount not in dashboard HTML')
+    return found[0].text_content().strip()
+
+
+def fetch_overdue_amounts_http(centres, concurrency=4, base_url=BASE_URL, timeout=WAIT_TIMEOUT):
+    """Return {centre: amount text or exception} using plain HTTP and one shared login."""
+    centres = [centre for centre in centres if centre.api_id]
+    if not centres:
+        return {}
+    email, password = credentials()
+    session = http_session(concurrency)
+    http_login(session, email, password, base_url, timeout)
+
+    def fetch(centre):
+        try:
+            response = session.get(f'{base_url}/{centre.api_id}/Home', timeout=timeout)
+            response.raise_for_status()
+            if '/Account/Login' in response.url:
+                raise DiscoverError('session expired')
+            return parse_overdue_amount(response.content)
+        except (requests.RequestException, DiscoverError) as e:
+            return e
+
+    with session, ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        return dict(zip(centres, pool.map(fetch, centres)))
+
+
+def fetch_overdue_amounts(centres, mode='auto', concurrency=4, headless=False):
+    """
+    Read every centre's overdue amount. 'http' and 'browser' use one path only;
+    'auto' tries HTTP first and sends just the failed centres to the browser.
+    If the browser can't start or log in, those centres keep the browser's error
+    and the amounts HTTP did read are still returned.
+    """
+    if mode == 'browser':
+        return scrape_overdue_amounts(centres, concurrency, headless)
+    try:
+        results = fetch_overdue_amounts_http(centres, concurrency)
+    except (requests.RequestException, DiscoverError) as e:
+        if mode == 'http':
+            raise DiscoverError(str(e))
+        results = {centre: e for centre in centres if centre.api_id}
+    failed = [centre for centre, amount in results.items() if isinstance(amount, Exception)]
+    if mode == 'auto' and failed:
+        try:
+            results.update(scrape_overdue_amounts(failed, concurrency, headless))
+        except (DiscoverError, WebDriverException) as e:
+            if len(failed) == len(results):
+                # Nothing was read at all: fail the run rather than record every centre as an error
+                raise DiscoverError(str(e)) from e
+            results.update({centre: e for centre in failed})
+    return results
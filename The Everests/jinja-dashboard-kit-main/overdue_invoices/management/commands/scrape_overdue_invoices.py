@@ -1,56 +1,56 @@
-from django.core.management.base import BaseCommand
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
+from django.core.management.base import BaseCommand, CommandError
 import time
-import os
+
+from overdue_invoices.discover import DiscoverError, fetch_overdue_amounts
+
 
 class Command(BaseCommand):
     help = 'Scrape overdue invoice amounts from Discover Childcare'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Dashboards read at once (all requests and browsers share one login)')
+        parser.add_argument('--headless', action='store_true', help='Run Chrome without a window')
+        parser.add_argument(
+            '--mode', choices=['auto', 'http', 'browser'], default='auto',
+            help='http: requests + lxml only; browser: Selenium only; auto: http, falling back to the browser for centres it could not read',
+        )
+
     def handle(self, *args, **options):
-        chrome_options = Options()
-        # chrome_options.add_argument('--headless')  # Disable headless for debugging
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
         from occupancy.models import Centre
-        centres = Centre.objects.all()
-
+        centres = list(Centre.objects.all())
         for centre in centres:
-            print(f"Scraping centre: {centre.name} ({centre.api_id})")
-            driver = webdriver.Chrome(options=chrome_options)
-            try:
-                # Login
-                driver.get('https://discoverchildcare.co.nz/Account/Login')
-                time.sleep(2)
-                email = os.environ.get('DISCOVER_EMAIL')
-                password_val = os.environ.get('DISCOVER_PASSWORD')
-                if not email or not password_val:
-                    print('Please set DISCOVER_EMAIL and DISCOVER_PASSWORD environment variables.')
-                    driver.quit()
-                    continue
-                email_input = driver.find_element(By.ID, 'Email')
-                password_input = driver.find_element(By.ID, 'Password')
-                email_input.send_keys(email)
-                password_input.send_keys(password_val)
-                driver.find_element(By.XPATH, "//button[@type='submit']").click()
-                time.sleep(5)  # Wait extra for dashboard
+            if not centre.api_id:
+                self.stdout.write(self.style.WARNING(f"{centre.name}: no Discover api_id, skipping"))
 
-                # Go to centre dashboard
-                dashboard_url = f"https://discoverchildcare.co.nz/{centre.api_id}/Home"
-                driver.get(dashboard_url)
-                time.sleep(3)
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
-                time.sleep(2)
+        started = time.monotonic()
+        try:
+            results = fetch_overdue_amounts(
+                centres, mode=options['mode'], concurrency=options['concurrency'], headless=options['headless']
+            )
+        except DiscoverError as e:
+            # Bad credentials or a failed login: exit non-zero so the scheduler reports it
+            raise CommandError(str(e))
 
-                try:
-                    label = driver.find_element(By.XPATH, "//h5[contains(text(), 'Overdue invoices amount')]")
-                    parent_div = label.find_element(By.XPATH, "../../..")
-                    amount_elem = parent_div.find_element(By.XPATH, ".//h1[@class='no-margins']")
-                    centre.overdue_invoice_amount = amount_elem.text
-                    centre.save()
-                    print(f"{centre.name} Overdue Invoice Amount saved:", amount_elem.text)
-                except Exception as e:
-                    print(f"{centre.name}: Could not find overdue invoice amount:", e)
-            finally:
-                driver.quit()
+        from occupancy import cache
+        from occupancy.models import OverdueSnapshot, parse_amount
+        saved = unchanged = 0
+        for centre, text in results.items():
+            if isinstance(text, Exception):
+                self.stderr.write(f"{centre.name}: Could not find overdue invoice amount: {text}")
+                continue
+            amount = parse_amount(text)
+            if amount is None:
+                self.stderr.write(f"{centre.name}: Could not parse overdue invoice amount: {text!r}")
+                continue
+            # Append to the history only when the amount has changed
+            if OverdueSnapshot.record(centre, amount) is None:
+                unchanged += 1
+                continue
+            centre.overdue_invoice_amount = str(amount)
+            centre.save(update_fields=['overdue_invoice_amount', 'updated_at'])
+            saved += 1
+            self.stdout.write(f"{centre.name} Overdue Invoice Amount saved: {amount}")
+        cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f"Scraped {len(results)} centres in {time.monotonic() - started:.1f}s: {saved} changed, {unchanged} unchanged"
+        ))
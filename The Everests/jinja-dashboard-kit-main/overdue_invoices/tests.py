@@ -0,0 +1,141 @@
+import io
+import os
+import threading
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+import requests
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+from occupancy.models import Centre, OverdueSnapshot
+
+from . import discover
+
+
+class DiscoverFixtureHandler(BaseHTTPRequestHandler):
+    """Serves a minimal copy of the Discover login page and centre dashboards."""
+
+    login_page = b"""<html><body><form method="post" action="/Account/Login">
+        <input type="hidden" name="__RequestVerificationToken" value="token-1">
+        <input id="Email" name="Email"><input id="Password" name="Password" type="password">
+        <button type="submit">Log in</button></form></body></html>"""
+    dashboard = """<html><body><div class="ibox"><div class="ibox-title"><div>
+        <h5>Overdue invoices amount</h5></div></div>
+        <div class="ibox-content"><h1 class="no-margins">{amount}</h1></div></div></body></html>"""
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, code, body=b'', headers=()):
+        self.send_response(code)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/Account/Login':
+            return self.send(200, self.login_page)
+        if 'session=ok' not in self.headers.get('Cookie', ''):
+            return self.send(302, headers=[('Location', '/Account/Login')])
+        if self.path == '/centre-1/Home':
+            return self.send(200, self.dashboard.format(amount='$1,234.50').encode())
+        return self.send(200, b'<html><body>Loading...</body></html>')
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        if form.get('__RequestVerificationToken') == ['token-1'] and form.get('Password') == ['secret']:
+            return self.send(302, headers=[('Location', '/'), ('Set-Cookie', 'session=ok; Path=/')])
+        return self.send(302, headers=[('Location', '/Account/Login')])
+
+
+@mock.patch.dict(os.environ, {'DISCOVER_EMAIL': 'admin@example.com', 'DISCOVER_PASSWORD': 'secret'})
+class DiscoverHttpTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), DiscoverFixtureHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_reads_amount_and_reports_unreadable_centres(self):
+        centres = [Centre(id=1, name='One', api_id='centre-1'), Centre(id=2, name='Two', api_id='centre-2'), Centre(id=3, name='None')]
+        results = discover.fetch_overdue_amounts_http(centres, concurrency=2, base_url=self.base_url)
+        self.assertEqual(results[centres[0]], '$1,234.50')
+        self.assertIsInstance(results[centres[1]], discover.DiscoverError)
+        self.assertNotIn(centres[2], results)
+
+    def test_bad_password(self):
+        with mock.patch.dict(os.environ, {'DISCOVER_PASSWORD': 'wrong'}):
+            with self.assertRaises(discover.DiscoverError):
+                discover.fetch_overdue_amounts_http([Centre(id=1, name='One', api_id='centre-1')], base_url=self.base_url)
+
+
+class DiscoverBrowserLoginTests(SimpleTestCase):
+    def driver(self, url=discover.LOGIN_URL):
+        return mock.Mock(current_url=url)
+
+    def test_login_page_that_never_loads(self):
+        driver = self.driver()
+        driver.find_element.side_effect = NoSuchElementException('no #Email')
+        with self.assertRaisesMessage(discover.DiscoverError, 'Discover login page did not load'):
+            discover.login(driver, 'admin@example.com', 'secret', timeout=0.1)
+
+    def test_still_on_the_login_page(self):
+        with self.assertRaisesMessage(discover.DiscoverError, 'still on the login page'):
+            discover.login(self.driver(), 'admin@example.com', 'secret', timeout=0.1)
+
+    def test_returns_the_session_cookies(self):
+        driver = self.driver(url=discover.BASE_URL + '/')
+        driver.get_cookies.return_value = [{'name': 'session', 'value': 'ok'}]
+        self.assertEqual(discover.login(driver, 'admin@example.com', 'secret', timeout=0.1), [{'name': 'session', 'value': 'ok'}])
+        driver.find_element.return_value.send_keys.assert_any_call('admin@example.com')
+
+
+@mock.patch.dict(os.environ, {'DISCOVER_EMAIL': 'admin@example.com', 'DISCOVER_PASSWORD': 'secret'})
+@mock.patch.object(discover, 'new_driver', side_effect=WebDriverException('no chrome'))
+@mock.patch.object(discover, 'fetch_overdue_amounts_http')
+class DiscoverFallbackTests(SimpleTestCase):
+    one = Centre(id=1, name='One', api_id='centre-1')
+    two = Centre(id=2, name='Two', api_id='centre-2')
+
+    def test_browser_failure_keeps_the_http_amounts(self, fetch_http, new_driver):
+        fetch_http.return_value = {self.one: '$1,234.50', self.two: discover.DiscoverError('no amount on dashboard')}
+        results = discover.fetch_overdue_amounts([self.one, self.two])
+        self.assertEqual(results[self.one], '$1,234.50')
+        self.assertIsInstance(results[self.two], discover.DiscoverError)
+        self.assertIn('Could not start Chrome: no chrome', str(results[self.two]))
+
+    def test_browser_failure_after_http_read_nothing_fails(self, fetch_http, new_driver):
+        fetch_http.side_effect = requests.ConnectionError('unreachable')
+        with self.assertRaisesMessage(discover.DiscoverError, 'Could not start Chrome'):
+            discover.fetch_overdue_amounts([self.one, self.two])
+
+
+@mock.patch('overdue_invoices.management.commands.scrape_overdue_invoices.fetch_overdue_amounts')
+class ScrapeCommandTests(TestCase):
+    def test_login_failure_fails_the_command(self, fetch):
+        fetch.side_effect = discover.DiscoverError('Discover login failed')
+        with self.assertRaisesMessage(CommandError, 'Discover login failed'):
+            call_command('scrape_overdue_invoices', stdout=io.StringIO())
+
+    def test_records_amounts_and_reports_unreadable_centres(self, fetch):
+        one = Centre.objects.create(name='One', api_id='centre-1')
+        two = Centre.objects.create(name='Two', api_id='centre-2')
+        fetch.return_value = {one: '$1,234.50', two: discover.DiscoverError('no amount on dashboard')}
+        out, err = io.StringIO(), io.StringIO()
+        call_command('scrape_overdue_invoices', stdout=out, stderr=err)
+        self.assertIn('1 changed, 0 unchanged', out.getvalue())
+        self.assertIn('Two: Could not find overdue invoice amount: no amount on dashboard', err.getvalue())
+        self.assertEqual(OverdueSnapshot.objects.get().amount, Decimal('1234.50'))